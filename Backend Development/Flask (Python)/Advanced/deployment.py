@@ -1,7 +1,18 @@
 # deployment.py
 
 from flask import Flask
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+import argparse
+import http.client
 import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
 
 app = Flask(__name__)
 
@@ -14,10 +25,472 @@ app.config['ENV'] = 'production'
 def home():
     return "Welcome to the Flask Application!"
 
+
+@app.route('/healthz')
+def healthz():
+    return "ok"
+
+
+# Production server
+#
+# app.run() starts Werkzeug's development server: one process, no worker
+# supervision and no graceful shutdown. serve() is a small pre-fork server
+# built on the same Werkzeug request handling:
+#
+# - the master imports the app (preloading it) and opens the listening
+#   socket, then forks the workers, so they share the app's memory
+#   copy-on-write and accept from the same socket
+# - each worker handles connections on a fixed-size thread pool
+# - HTTP/1.1 keep-alive connections are closed after `keepalive` idle seconds
+# - SIGTERM/SIGINT stop accepting, let in-flight requests finish for up to
+#   `graceful_timeout` seconds, then exit; crashed workers are replaced
+#
+# It is POSIX-only (it relies on fork). For a hardened server, the same
+# settings map directly onto gunicorn:
+#   gunicorn -w 9 --threads 4 --keep-alive 2 --preload -b 0.0.0.0:8000 deployment:app
+#
+# serve(reuse_port=True) trades the preloaded, shared socket for zero-downtime
+# deploys; see the "Rolling reload" section below.
+
+def default_workers():
+    """The usual (2 x cores) + 1 worker count."""
+    return (os.cpu_count() or 1) * 2 + 1
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles each connection on a bounded thread pool."""
+
+    multithread = True
+    draining = False
+
+    def __init__(self, listener, app, threads, handler):
+        # Created first: Werkzeug calls server_close() while adopting the socket
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, handler=handler, fd=listener.fileno())
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def close(self):
+        """Wait for in-flight requests, then close the socket."""
+        self.pool.shutdown(wait=True)
+        self.server_close()
+
+    def drain(self):
+        """Stop taking connections, then wait for in-flight requests."""
+        self.draining = True
+        self.server_close()
+        self.pool.shutdown(wait=True)
+
+
+def make_handler(keepalive):
+    """Request handler speaking HTTP/1.1 with an idle keep-alive timeout."""
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = keepalive
+
+        def log_request(self, *args, **kwargs):
+            # Per-request access logging costs more than a small request itself
+            pass
+
+        def handle_one_request(self):
+            super().handle_one_request()
+            if self.server.draining:
+                # Don't wait out the keep-alive timeout on a worker that's leaving
+                self.close_connection = True
+
+    return KeepAliveHandler
+
+
+def _run_worker(listener, threads, keepalive):
+    server = PooledWSGIServer(listener, app, threads, make_handler(keepalive))
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it from another thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The master handles Ctrl+C
+    server.serve_forever()
+    server.close()
+    os._exit(0)
+
+
+def serve(host='0.0.0.0', port=8000, workers=None, threads=4, keepalive=2,
+          backlog=2048, graceful_timeout=30):
+    """Run the app on a pre-fork, multi-threaded server until SIGTERM or SIGINT."""
+    workers = workers or default_workers()
+    listener = socket.create_server((host, port), backlog=backlog)
+    children = set()
+    stopping = threading.Event()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(listener, threads, keepalive)
+            finally:
+                # Never fall back into the master's loop from a worker
+                os._exit(1)
+        children.add(pid)
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"Serving on http://{host}:{port} with {workers} workers x {threads} threads "
+          f"(pid {os.getpid()})", flush=True)
+
+    # Supervise: replace workers that die until asked to stop
+    while not stopping.is_set():
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid:
+            children.discard(pid)
+            if not stopping.is_set():
+                spawn()
+        else:
+            stopping.wait(0.5)
+
+    listener.close()
+    for pid in children:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + graceful_timeout
+    while children and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.discard(pid)
+        else:
+            time.sleep(0.1)
+    for pid in children:
+        os.kill(pid, signal.SIGKILL)
+    print("Server stopped", flush=True)
+
+
+# Rolling reload
+#
+# The pre-fork server above forks every worker from one preloaded master, so
+# a deploy means restarting everything: requests in flight are cut off and the
+# new workers start cold. serve_reloadable() runs each worker as a fresh
+# interpreter instead, so a reload picks up new code, and gives each worker
+# slot its own socket bound to the same port with SO_REUSEPORT; the kernel
+# spreads new connections across the slots. On SIGHUP the master replaces
+# the workers as a generation:
+#
+# 1. start the new workers; each imports the code, warms up, passes a
+#    readiness check and starts accepting on its slot's socket before
+#    reporting READY, so no connection ever waits on a cold worker
+# 2. once every new worker is READY, send SIGTERM to the old ones; if any
+#    fails or times out, the new generation is killed and the old one keeps
+#    serving
+# 3. old workers stop accepting, finish in-flight requests and exit
+#
+# The master keeps the sockets open across generations. Closing a
+# SO_REUSEPORT socket resets every connection still waiting in its accept
+# queue (unless net.ipv4.tcp_migrate_req = 1 on Linux 5.14+), so old and new
+# workers share each slot's socket and whatever is queued on it is picked up
+# by the new worker.
+#
+# Reload with: kill -HUP <master pid>
+
+# Requests made through the test client before a worker takes traffic.
+# Routes that render templates, open database connections or fill caches
+# warm them as a side effect.
+app.config.setdefault('WARMUP_PATHS', ['/'])
+app.config.setdefault('READINESS_PATH', '/healthz')
+
+
+def warm_up():
+    """Do the first-request work up front; return True if the worker is ready to serve."""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    client = app.test_client()
+    for path in app.config['WARMUP_PATHS']:
+        client.get(path)
+    return client.get(app.config['READINESS_PATH']).status_code == 200
+
+
+def _run_reuseport_worker(fd, ready_fd, threads, keepalive):
+    if not warm_up():
+        print("Readiness check failed", file=sys.stderr, flush=True)
+        sys.exit(1)
+
+    listener = socket.socket(fileno=fd)
+    server = PooledWSGIServer(listener, app, threads, make_handler(keepalive))
+    listener.close()  # The server holds its own descriptor for the socket
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    serving = threading.Thread(target=server.serve_forever)
+    serving.start()
+    # Readiness goes over its own pipe so stdout stays the app's; a pipe that
+    # nobody drains would block the worker once it filled up
+    with os.fdopen(ready_fd, 'wb') as ready:
+        ready.write(b"READY\n")
+    serving.join()
+    server.drain()
+
+
+def _wait_ready(ready_fds, timeout):
+    """Wait for READY on every worker's readiness pipe; False if one fails or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    pending = set(ready_fds)
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        readable, _, _ = select.select(list(pending), [], [], remaining)
+        for fd in readable:
+            # A worker that exits before READY closes the pipe: the read returns b''
+            if os.read(fd, 64).strip() != b'READY':
+                return False
+            pending.discard(fd)
+    return True
+
+
+def serve_reloadable(host='0.0.0.0', port=8000, workers=None, threads=4, keepalive=2,
+                     backlog=2048, graceful_timeout=30, ready_timeout=60):
+    """Run the app on SO_REUSEPORT workers; SIGHUP reloads them without dropping requests."""
+    workers = workers or default_workers()
+    sockets = [socket.create_server((host, port), backlog=backlog, reuse_port=True)
+               for _ in range(workers)]
+    script = os.path.abspath(__file__)
+    stopping = threading.Event()
+    reloading = threading.Event()
+
+    def start(slots):
+        processes = []
+        ready_fds = []
+        try:
+            for slot in slots:
+                ready_fd, ready_write_fd = os.pipe()
+                ready_fds.append(ready_fd)
+                try:
+                    processes.append(subprocess.Popen(
+                        [sys.executable, script, 'worker', '--fd', str(sockets[slot].fileno()),
+                         '--ready-fd', str(ready_write_fd),
+                         '--threads', str(threads), '--keepalive', str(keepalive)],
+                        pass_fds=(sockets[slot].fileno(), ready_write_fd)
+                    ))
+                finally:
+                    # Only the worker may hold the write end, or EOF never arrives
+                    os.close(ready_write_fd)
+            ready = _wait_ready(ready_fds, ready_timeout)
+        finally:
+            for fd in ready_fds:
+                os.close(fd)
+        if ready:
+            return processes
+        for process in processes:
+            process.kill()
+            process.wait()
+        return None
+
+    def retire(processes):
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + graceful_timeout
+        for process in processes:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    def reload(signum, frame):
+        reloading.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, reload)
+
+    current = start(range(workers))
+    if current is None:
+        raise RuntimeError("Workers failed their readiness check")
+    print(f"Serving on http://{host}:{port} with {workers} workers x {threads} threads "
+          f"(pid {os.getpid()}, SIGHUP to reload)", flush=True)
+
+    while not stopping.is_set():
+        if reloading.is_set():
+            reloading.clear()
+            replacement = start(range(workers))
+            if replacement is None:
+                print("Reload aborted: new workers failed their readiness check", flush=True)
+            else:
+                previous, current = current, replacement
+                retire(previous)
+                print(f"Reloaded: {len(previous)} workers replaced", flush=True)
+            continue
+        # Replace workers that die outside of a reload
+        for slot, process in enumerate(current):
+            if process.poll() is not None:
+                current[slot] = (start([slot]) or [process])[0]
+        stopping.wait(0.5)
+
+    retire(current)
+    for listener in sockets:
+        listener.close()
+    print("Server stopped", flush=True)
+
+
+def _wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def load_test(host, port, duration=5.0, concurrency=32, path='/'):
+    """Hit the server from `concurrency` keep-alive clients; return (ok, failed) counts."""
+    deadline = time.monotonic() + duration
+    totals = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def client():
+        ok = failed = 0
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        reused = False
+        while time.monotonic() < deadline:
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                reused = True
+                if response.status == 200:
+                    ok += 1
+                else:
+                    failed += 1
+            except (OSError, http.client.HTTPException) as exc:
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=10)
+                if reused and isinstance(exc, (BrokenPipeError, ConnectionResetError)):
+                    # The server closed an idle keep-alive connection as the request
+                    # went out; like browsers, retry it once on a new connection
+                    reused = False
+                    continue
+                failed += 1
+                reused = False
+        connection.close()
+        with lock:
+            totals['ok'] += ok
+            totals['failed'] += failed
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return totals['ok'], totals['failed']
+
+
+def benchmark(duration=5.0, concurrency=32):
+    """Compare the throughput of app.run() with serve() under the same load."""
+    host = '127.0.0.1'
+    script = os.path.abspath(__file__)
+    results = {}
+    for name, command, port in (
+        ('app.run', 'dev', 8101),
+        ('serve', 'serve', 8102),
+    ):
+        process = subprocess.Popen(
+            [sys.executable, script, command, '--host', host, '--port', str(port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_for_port(host, port)
+            ok, failed = load_test(host, port, duration, concurrency)
+        finally:
+            process.send_signal(signal.SIGINT)
+            process.wait(timeout=60)
+        results[name] = ok / duration
+        print(f"{name:<8} {ok / duration:>10,.0f} req/s  ({failed} failed)")
+    print(f"Speedup: {results['serve'] / results['app.run']:.1f}x")
+    return results
+
+
+def reload_test(reloads=3, duration=8.0, concurrency=16):
+    """Run load through rolling reloads and assert that no request failed."""
+    host, port = '127.0.0.1', 8103
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve', '--reuse-port',
+         '--host', host, '--port', str(port), '--workers', '2'],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    result = {}
+    try:
+        _wait_for_port(host, port)
+        loader = threading.Thread(
+            target=lambda: result.update(zip(('ok', 'failed'), load_test(host, port, duration, concurrency)))
+        )
+        loader.start()
+        for _ in range(reloads):
+            time.sleep(duration / (reloads + 1))
+            process.send_signal(signal.SIGHUP)
+        loader.join()
+    finally:
+        process.send_signal(signal.SIGINT)
+        output, _ = process.communicate(timeout=60)
+
+    completed = output.decode().count("Reloaded:")
+    print(f"{result['ok']} requests, {result['failed']} failed, {completed}/{reloads} reloads")
+    assert completed == reloads, "Not every reload completed"
+    assert result['failed'] == 0, f"{result['failed']} requests failed during reloads"
+    return result
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the deployment example.")
+    parser.add_argument('command', nargs='?', choices=['serve', 'dev', 'benchmark', 'reload-test', 'worker'],
+                        default='serve' if app.config['ENV'] == 'production' else 'dev')
     # Get the host and port from environment variables or use defaults
-    host = os.environ.get('FLASK_RUN_HOST', '0.0.0.0')
-    port = int(os.environ.get('FLASK_RUN_PORT', 5000))
-    
-    # Run the application
-    app.run(host=host, port=port)
\ No newline at end of file
+    parser.add_argument('--host', default=os.environ.get('FLASK_RUN_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('FLASK_RUN_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 0)) or None)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--keepalive', type=int, default=2)
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--reuse-port', action='store_true',
+                        help="Use SO_REUSEPORT workers that reload on SIGHUP")
+    parser.add_argument('--fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--ready-fd', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.command == 'serve' and args.reuse_port:
+        serve_reloadable(args.host, args.port, args.workers, args.threads, args.keepalive, args.backlog)
+    elif args.command == 'serve':
+        serve(args.host, args.port, args.workers, args.threads, args.keepalive, args.backlog)
+    elif args.command == 'worker':
+        # Started by serve_reloadable(), not meant to be run by hand
+        _run_reuseport_worker(args.fd, args.ready_fd, args.threads, args.keepalive)
+    elif args.command == 'benchmark':
+        benchmark()
+    elif args.command == 'reload-test':
+        reload_test()
+    else:
+        # Run the application on the development server
+        app.run(host=args.host, port=args.port)
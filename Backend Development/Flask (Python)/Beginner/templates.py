@@ -5,10 +5,158 @@ Flask Templates
 This module demonstrates how to use templates in Flask with Jinja2.
 """
 
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from collections import OrderedDict, defaultdict
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 app = Flask(__name__)
 
+# Jinja compiles each template to Python code the first time it's used, in
+# every worker process. A bytecode cache on disk lets all workers (and every
+# restart) reuse the compiled code: entries are keyed by template path and
+# checked against the source, and they're written atomically, so workers can
+# share a directory safely. By default Jinja picks a private per-user
+# directory under the system temp dir; set JINJA_BYTECODE_CACHE=0 to disable.
+if os.environ.get('JINJA_BYTECODE_CACHE', '1') != '0':
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(os.environ.get('JINJA_BYTECODE_CACHE_DIR'))
+
+
+# Fragment caching
+#
+# Parts of a page that only change with their data can be rendered once and
+# reused:
+#
+#     {% cache 'products', 300, ['products'] %}
+#         ... expensive loop ...
+#     {% endcache %}
+#
+# The arguments are a key, a TTL in seconds (0 for no expiry) and optional
+# tags. Everything outside the block is still rendered on every request, so
+# per-user parts of the page stay dynamic. When the data behind a fragment
+# changes, drop it with fragment_cache.invalidate(key) or
+# fragment_cache.invalidate_tag(tag). The cache is per process.
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments, bounded by their size in bytes."""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (html, expires, tags, size)
+        self._keys_by_tag = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, html, ttl=0, tags=()):
+        size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (html, expires, tuple(tags), size)
+            self.size += size
+            for tag in tags:
+                self._keys_by_tag[tag].add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, _, tags, size = self._entries.pop(key)
+        self.size -= size
+        for tag in tags:
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class FragmentCacheExtension(Extension):
+    """Adds {% cache key, ttl[, tags] %}...{% endcache %} to Jinja."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        parser.stream.expect('comma')
+        args.append(parser.parse_expression())
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(()))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, tags, caller):
+        cache = self.environment.fragment_cache
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html, ttl, tags)
+        return html
+
+
+app.jinja_env.add_extension(FragmentCacheExtension)
+fragment_cache = app.jinja_env.fragment_cache
+
 @app.route('/')
 def index():
     """Render the index page with dynamic content."""
@@ -28,15 +176,30 @@ def user_profile(username):
     }
     return render_template('user_profile.html', user=user, title=f'{username}\'s Profile')
 
+# Sample product data - in a real app, this would come from a database
+PRODUCTS = [
+    {'id': 1, 'name': 'Product A', 'price': 19.99},
+    {'id': 2, 'name': 'Product B', 'price': 29.99},
+    {'id': 3, 'name': 'Product C', 'price': 39.99}
+]
+
 @app.route('/products')
 def products():
     """Render a page with multiple products using loops in the template."""
-    products = [
-        {'id': 1, 'name': 'Product A', 'price': 19.99},
-        {'id': 2, 'name': 'Product B', 'price': 29.99},
-        {'id': 3, 'name': 'Product C', 'price': 39.99}
-    ]
-    return render_template('products.html', products=products, title='Our Products')
+    # The product list is rendered once and cached under the 'products' tag
+    return render_template('products.html', products=PRODUCTS, title='Our Products')
+
+def update_product_price(product_id, price):
+    """Change a product and drop every cached fragment that shows products."""
+    for product in PRODUCTS:
+        if product['id'] == product_id:
+            product['price'] = price
+    fragment_cache.invalidate_tag('products')
+
+@app.route('/fragment-cache/stats')
+def fragment_cache_stats():
+    """Report fragment cache size and hit rate."""
+    return jsonify(fragment_cache.stats())
 
 @app.route('/conditional')
 def conditional_example():
@@ -48,6 +211,83 @@ def conditional_example():
                           user_type=user_type,
                           title='Conditional Example')
 
+def preload_templates():
+    """
+    Load every template now so no request pays for compiling one.
+
+    With a warm bytecode cache this only unmarshals code. Returns the time
+    taken in milliseconds.
+    """
+    start = time.perf_counter()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    return (time.perf_counter() - start) * 1000
+
+
+# Preload at app creation, in every worker, before it takes traffic
+PRELOAD_MS = preload_templates() if os.environ.get('PRELOAD_TEMPLATES', '1') != '0' else None
+
+
+BENCHMARK_PAGES = [
+    ('index.html', '/'),
+    ('user_profile.html', '/user/alice'),
+    ('products.html', '/products'),
+    ('conditional.html', '/conditional'),
+]
+
+
+def first_request_timings():
+    """Time the first request to each page in this process, in milliseconds."""
+    client = app.test_client()
+    client.get('/__warmup__')  # Keep Flask's own first-request setup out of the numbers
+    timings = {}
+    for template, url in BENCHMARK_PAGES:
+        start = time.perf_counter()
+        client.get(url)
+        timings[template] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def benchmark_cold_start(runs=7):
+    """
+    Compare the first request per template in fresh worker processes.
+
+    Each run starts a new interpreter, like a worker after a restart, in
+    three setups: compiling from source, loading from a warm bytecode cache,
+    and preloading from the cache at startup. Prints median milliseconds.
+    """
+    if not app.jinja_env.list_templates():
+        print("No templates found, skipping the benchmark.")
+        return None
+
+    cache_dir = tempfile.mkdtemp(prefix='jinja-bytecode-')
+    modes = [
+        ('compile from source', {'JINJA_BYTECODE_CACHE': '0', 'PRELOAD_TEMPLATES': '0'}),
+        ('bytecode cache', {'PRELOAD_TEMPLATES': '0'}),
+        ('cache + preload', {'PRELOAD_TEMPLATES': '1'}),
+    ]
+
+    def run(overrides):
+        env = dict(os.environ, JINJA_BYTECODE_CACHE_DIR=cache_dir, **overrides)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--first-request'],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        return json.loads(output)
+
+    run({'PRELOAD_TEMPLATES': '1'})  # Fill the cache
+    names = [template for template, _ in BENCHMARK_PAGES]
+    print(f"{'':<22}{'startup':>10}" + "".join(f"{name:>19}" for name in names) + f"{'total':>9}")
+    results = {}
+    for label, overrides in modes:
+        samples = [run(overrides) for _ in range(runs)]
+        medians = {name: statistics.median(sample[name] for sample in samples) for name in names}
+        preload = statistics.median(sample['preload'] or 0.0 for sample in samples)
+        results[label] = dict(medians, preload=preload)
+        print(f"{label:<22}{preload:>8.2f}ms" + "".join(f"{medians[name]:>17.2f}ms" for name in names)
+              + f"{sum(medians.values()):>7.2f}ms")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
 def template_directory_structure():
     """
     Print a guide to the expected template directory structure.
@@ -73,6 +313,13 @@ def template_directory_structure():
     """)
 
 if __name__ == '__main__':
+    if '--first-request' in sys.argv:
+        # Used by benchmark_cold_start() in a fresh process
+        print(json.dumps(dict(first_request_timings(), preload=PRELOAD_MS)))
+        sys.exit()
+    if '--benchmark' in sys.argv:
+        benchmark_cold_start()
+        sys.exit()
     template_directory_structure()
     print("\nTo run this example, make sure you have created the necessary template files.")
     app.run(debug=True)
\ No newline at end of file
@@ -1,22 +1,277 @@
 from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import object_session
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import UserMixin, LoginManager
+from flask_login import UserMixin, LoginManager, current_user, login_required
+from common import BloomFilter, PasswordCost
+from collections import OrderedDict
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 app.config['SECRET_KEY'] = 'your_secret_key'
+# Access-token signing keys by key id; add a new key and make it active to rotate
+app.config['TOKEN_KEYS'] = {'k1': 'your_token_signing_key'}
+app.config['TOKEN_ACTIVE_KEY'] = 'k1'
+app.config['TOKEN_TTL_SECONDS'] = 900
+# Password hashing cost is calibrated to this latency on the current machine
+app.config['PASSWORD_HASH_TARGET_MS'] = 250
+app.config['PASSWORD_HASH_MIN_ITERATIONS'] = 100000
+app.config['PASSWORD_HASH_METHOD'] = None  # e.g. 'pbkdf2:sha256:600000' to pin it
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 
+password_cost = PasswordCost(app.config)
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(150), nullable=False)
+    roles = db.Column(db.String(150), nullable=False, default='user')  # Comma-separated
+
+# Usernames seen so far; a definite miss lets register skip its SELECT
+username_filter = BloomFilter.for_count(0)
+username_filter_loaded = False
+username_stats = {'checks': 0, 'selects_saved': 0, 'false_positives': 0}
+
+def load_username_filter():
+    """(Re)build the filter, sized from the current number of users."""
+    global username_filter, username_filter_loaded
+    bloom = BloomFilter.for_count(db.session.query(db.func.count(User.id)).scalar())
+    for (username,) in db.session.query(User.username):
+        bloom.add(username)
+    username_filter = bloom
+    username_filter_loaded = True
+
+def username_exists(username):
+    if not username_filter_loaded:
+        load_username_filter()
+    username_stats['checks'] += 1
+    if username not in username_filter:
+        username_stats['selects_saved'] += 1
+        return False
+    if User.query.filter_by(username=username).first():
+        return True
+    username_stats['false_positives'] += 1
+    return False
+
+@event.listens_for(User, 'after_insert')
+def add_username_to_filter(mapper, connection, target):
+    global username_filter_loaded
+    username_filter.add(target.username)
+    if username_filter.full:
+        # Rebuild at twice the size on the next check
+        username_filter_loaded = False
+
+class SessionUser(UserMixin):
+    """Detached snapshot of the user fields an authenticated request needs."""
+
+    def __init__(self, id, username, roles=()):
+        self.id = id
+        self.username = username
+        self.roles = tuple(roles)
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.roles.split(','))
+
+class IdentityCache:
+    """
+    Bounded LRU of SessionUser snapshots that expire after `ttl` seconds.
+
+    Updates and deletes invalidate entries in this process immediately; the
+    TTL bounds how long other worker processes can serve a stale identity.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_seconds = 0.0
+        self.invalidations = 0
+
+    def get_or_load(self, user_id, load):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            invalidations = self.invalidations
+
+        started = time.perf_counter()
+        user = load(user_id)
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.load_seconds += elapsed
+            # Don't store a snapshot that an invalidation may have superseded mid-load
+            if user is not None and self.invalidations == invalidations:
+                self.entries[user_id] = (now + self.ttl, user)
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.invalidations += 1
+            self.entries.pop(user_id, None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            average_load_ms = self.load_seconds / self.misses * 1000 if self.misses else 0.0
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'average_db_load_ms': average_load_ms,
+                # Every hit skipped one database load
+                'latency_saved_per_request_ms': average_load_ms * self.hits / lookups if lookups else 0.0
+            }
+
+identity_cache = IdentityCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_identity(mapper, connection, target):
+    identity_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_committed_identities(session):
+    """
+    Invalidate again once the change is committed.
+
+    A load_user between the flush and the commit still read the old row and
+    may have cached it; this drops that snapshot instead of serving it for a TTL.
+    """
+    for user_id in session.info.pop('changed_user_ids', ()):
+        identity_cache.invalidate(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_rolled_back_identities(session):
+    session.info.pop('changed_user_ids', None)
+
+def load_user_from_db(user_id):
+    user = db.session.get(User, user_id)
+    return SessionUser.from_user(user) if user else None
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.get_or_load(int(user_id), load_user_from_db)
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+class TokenSigner:
+    """
+    Issues and verifies HMAC-SHA256 signed access tokens.
+
+    A token is `key_id.payload.signature` with a base64url JSON payload holding
+    the user id, username, roles, expiry and a unique token id. Verifying is
+    pure CPU work: no database access. Old keys stay valid for verification
+    after rotation until they are retired, and a small revocation list keeps
+    logged-out tokens out until they would have expired anyway.
+    """
+
+    def __init__(self, keys, active_key_id, ttl=900):
+        self.keys = {key_id: secret.encode('utf-8') for key_id, secret in keys.items()}
+        self.active_key_id = active_key_id
+        self.ttl = ttl
+        self.revoked = {}
+        self.lock = threading.Lock()
+
+    def rotate(self, key_id, secret):
+        """Sign new tokens with a new key; tokens signed with older keys still verify."""
+        self.keys[key_id] = secret.encode('utf-8')
+        self.active_key_id = key_id
+
+    def retire(self, key_id):
+        """Stop accepting tokens signed with an old key."""
+        if key_id != self.active_key_id:
+            self.keys.pop(key_id, None)
+
+    def _sign(self, key, signing_input):
+        return _b64encode(hmac.new(key, signing_input.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, user):
+        payload = {
+            'sub': user.id,
+            'name': user.username,
+            'roles': list(user.roles),
+            'exp': int(time.time()) + self.ttl,
+            'jti': secrets.token_urlsafe(8)
+        }
+        body = _b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        signing_input = f"{self.active_key_id}.{body}"
+        return f"{signing_input}.{self._sign(self.keys[self.active_key_id], signing_input)}"
+
+    def verify(self, token):
+        """Return the token's claims, or None if it is malformed, forged, expired or revoked."""
+        # Valid tokens are pure ASCII; anything else would make the signature
+        # comparison raise instead of fail
+        if not token.isascii():
+            return None
+        try:
+            key_id, body, signature = token.split('.')
+        except ValueError:
+            return None
+        key = self.keys.get(key_id)
+        if key is None or not hmac.compare_digest(signature, self._sign(key, f"{key_id}.{body}")):
+            return None
+        try:
+            claims = json.loads(_b64decode(body))
+        except ValueError:
+            return None
+        if claims['exp'] < time.time() or claims['jti'] in self.revoked:
+            return None
+        return claims
+
+    def revoke(self, claims):
+        now = time.time()
+        with self.lock:
+            # Entries only matter until the token would have expired anyway
+            self.revoked = {jti: exp for jti, exp in self.revoked.items() if exp >= now}
+            self.revoked[claims['jti']] = claims['exp']
+
+token_signer = TokenSigner(
+    app.config['TOKEN_KEYS'],
+    app.config['TOKEN_ACTIVE_KEY'],
+    app.config['TOKEN_TTL_SECONDS']
+)
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    return header[7:] if header.startswith('Bearer ') else None
+
+@login_manager.request_loader
+def load_user_from_token(request):
+    token = bearer_token()
+    claims = token_signer.verify(token) if token else None
+    if claims is None:
+        return None
+    return SessionUser(claims['sub'], claims['name'], claims['roles'])
 
 @app.route('/register', methods=['POST'])
 def register():
@@ -24,13 +279,18 @@ def register():
     username = data.get('username')
     password = data.get('password')
 
-    if User.query.filter_by(username=username).first():
+    if username_exists(username):
         return jsonify({'message': 'User already exists!'}), 400
 
-    hashed_password = generate_password_hash(password, method='sha256')
+    hashed_password = generate_password_hash(password, method=password_cost.method)
     new_user = User(username=username, password=hashed_password)
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The UNIQUE constraint remains the final arbiter
+        db.session.rollback()
+        return jsonify({'message': 'User already exists!'}), 400
 
     return jsonify({'message': 'User registered successfully!'}), 201
 
@@ -42,13 +302,92 @@ def login():
 
     user = User.query.filter_by(username=username).first()
     if user and check_password_hash(user.password, password):
-        return jsonify({'message': 'Login successful!'}), 200
+        # Upgrade hashes made with older cost parameters while we have the password
+        if password_cost.needs_rehash(user.password):
+            user.password = generate_password_hash(password, method=password_cost.method)
+            db.session.commit()
+        return jsonify({
+            'message': 'Login successful!',
+            'access_token': token_signer.issue(SessionUser.from_user(user)),
+            'token_type': 'Bearer',
+            'expires_in': token_signer.ttl
+        }), 200
     return jsonify({'message': 'Invalid credentials!'}), 401
 
+@app.route('/me', methods=['GET'])
+@login_required
+def me():
+    return jsonify({'id': current_user.id, 'username': current_user.username,
+                    'roles': list(current_user.roles)}), 200
+
+@app.route('/register/stats', methods=['GET'])
+def register_stats():
+    absent = username_stats['selects_saved'] + username_stats['false_positives']
+    return jsonify({
+        **username_stats,
+        'false_positive_rate': username_stats['false_positives'] / absent if absent else 0.0
+    }), 200
+
+@app.route('/identity-cache/stats', methods=['GET'])
+def identity_cache_stats():
+    return jsonify(identity_cache.stats()), 200
+
 @app.route('/logout', methods=['POST'])
 def logout():
+    token = bearer_token()
+    claims = token_signer.verify(token) if token else None
+    if claims:
+        token_signer.revoke(claims)
     return jsonify({'message': 'Logout successful!'}), 200
 
+def upgrade_schema():
+    """
+    Add columns introduced after a database was first created.
+
+    create_all() only creates missing tables, so an existing users.db gets the
+    roles column here; existing accounts become plain users.
+    """
+    with db.engine.begin() as connection:
+        existing = {column['name'] for column in inspect(connection).get_columns(User.__tablename__)}
+        if 'roles' not in existing:
+            connection.execute(text(
+                f"ALTER TABLE \"{User.__tablename__}\" ADD COLUMN roles VARCHAR(150) NOT NULL DEFAULT 'user'"
+            ))
+
+def benchmark_token_verification(iterations=100000):
+    """Compare token verifications per second with DB-backed load_user lookups."""
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        user = User.query.first()
+        if user is None:
+            user = User(username='benchmark_user', password=generate_password_hash('benchmark'))
+            db.session.add(user)
+            db.session.commit()
+        token = token_signer.issue(SessionUser.from_user(user))
+        user_id = user.id
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            token_signer.verify(token)
+        token_rate = iterations / (time.perf_counter() - started)
+
+        # Bypass the identity cache to measure the database round-trip itself
+        lookups = max(1, iterations // 10)
+        started = time.perf_counter()
+        for _ in range(lookups):
+            load_user_from_db(user_id)
+            db.session.expire_all()
+        db_rate = lookups / (time.perf_counter() - started)
+
+    print(f"Token verification: {token_rate:>10,.0f}/s")
+    print(f"DB load_user:       {db_rate:>10,.0f}/s")
+    print(f"Speedup:            {token_rate / db_rate:>10.1f}x")
+    return token_rate, db_rate
+
 if __name__ == '__main__':
-    db.create_all()
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        load_username_filter()
     app.run(debug=True)
\ No newline at end of file
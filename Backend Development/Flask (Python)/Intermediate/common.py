@@ -0,0 +1,115 @@
+"""
+Helpers Shared by the Intermediate Examples
+===========================================
+
+databases.py and authentication.py both pre-check usernames with a Bloom
+filter and calibrate their password hashing cost; the implementations live
+here so the two examples can't drift apart.
+"""
+
+import hashlib
+import math
+import time
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set: a miss is definite, a hit only means "maybe".
+
+    Sized for `capacity` values at the requested false-positive rate, using
+    double hashing over a single BLAKE2b digest to derive the bit positions.
+    Past capacity the false-positive rate climbs quickly, so callers rebuild
+    a bigger filter once `full` is True.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    @classmethod
+    def for_count(cls, count, error_rate=0.01, min_capacity=1024):
+        """A filter for `count` existing values with room to double before it fills up."""
+        return cls(max(min_capacity, 2 * count), error_rate)
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+    def add(self, value):
+        self.count += 1
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def calibrate_password_method(target_ms, min_iterations=100000, algorithm='sha256'):
+    """
+    Pick the PBKDF2 iteration count that takes about target_ms on this machine.
+
+    Times a short run, scales it linearly to the target and never goes below
+    min_iterations. Returns a Werkzeug method string such as
+    'pbkdf2:sha256:600000'; the parameters are stored in every hash made with it.
+    """
+    iterations = 10000
+    while True:
+        started = time.perf_counter()
+        hashlib.pbkdf2_hmac(algorithm, b'calibration password', b'calibration salt', iterations)
+        elapsed = time.perf_counter() - started
+        # Scale from a run long enough that timer noise doesn't dominate
+        if elapsed >= 0.02:
+            break
+        iterations *= 2
+    target = int(iterations * target_ms / 1000 / elapsed)
+    target = max(min_iterations, round(target, -3))
+    return f'pbkdf2:{algorithm}:{target}'
+
+
+class PasswordCost:
+    """
+    The password hashing method for an app, calibrated once per process on first use.
+
+    Reads PASSWORD_HASH_TARGET_MS, PASSWORD_HASH_MIN_ITERATIONS and
+    PASSWORD_HASH_METHOD from the app config; setting PASSWORD_HASH_METHOD
+    (e.g. 'pbkdf2:sha256:600000') pins the cost across workers.
+    """
+
+    def __init__(self, config):
+        config.setdefault('PASSWORD_HASH_TARGET_MS', 250)
+        config.setdefault('PASSWORD_HASH_MIN_ITERATIONS', 100000)
+        config.setdefault('PASSWORD_HASH_METHOD', None)
+        self.config = config
+        self._method = None
+
+    @property
+    def method(self):
+        if self._method is None:
+            self._method = self.config['PASSWORD_HASH_METHOD'] or calibrate_password_method(
+                self.config['PASSWORD_HASH_TARGET_MS'],
+                self.config['PASSWORD_HASH_MIN_ITERATIONS']
+            )
+        return self._method
+
+    def needs_rehash(self, password_hash, tolerance=0.25):
+        """
+        True if a hash was made with a different algorithm or a noticeably different cost.
+
+        Each process calibrates on its own, so iteration counts within `tolerance`
+        of the current one are accepted rather than rehashed on every login.
+        """
+        stored = password_hash.split('$', 1)[0].split(':')
+        current = self.method.split(':')
+        if stored[:2] != current[:2] or len(stored) != 3:
+            return True
+        return abs(int(stored[2]) - int(current[2])) > tolerance * int(current[2])
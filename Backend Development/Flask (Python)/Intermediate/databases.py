@@ -6,23 +6,175 @@ This module demonstrates how to use SQLAlchemy with Flask to interact with datab
 It showcases model definitions, relationships, migrations, and CRUD operations.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, object_session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from collections import Counter, OrderedDict
+from io import StringIO
 from datetime import datetime
+from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
+from common import BloomFilter, PasswordCost
+import csv
+import json
+import logging
 import os
+import random
+import re
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
 
 app = Flask(__name__)
 
 # Database Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///flask_db.sqlite'  # SQLite for development
+DB_PATH = os.environ.get('FLASK_DB_PATH', os.path.join(app.instance_path, 'flask_db.sqlite'))
+os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'  # SQLite for development
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite allows a single writer at a time, so all writes share one pooled
+# connection and queue for it instead of failing with "database is locked".
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 30}
+
+READ_POOL_SIZE = int(os.environ.get('FLASK_DB_READ_POOL_SIZE', 8))
+
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',    # Safe with WAL, avoids an fsync per commit
+    'busy_timeout': 5000,       # Wait up to 5s for a lock instead of failing
+    'mmap_size': 268435456,     # Memory-map up to 256MB of the file
+    'cache_size': -64000        # 64MB page cache (negative means KiB)
+}
+
+def configure_sqlite_connection(dbapi_connection, read_only=False):
+    """Apply the performance pragmas to a freshly opened SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # WAL lets readers proceed while the writer commits; it is stored in the file
+        cursor.execute("PRAGMA journal_mode = WAL")
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+class RoutingSession(FlaskSession):
+    """
+    Session that sends flushes and DML to the writer and other queries to the read pool.
+    
+    Once a transaction has written, its uncommitted rows are only visible on the
+    writer's connection, so every later query stays there until commit or rollback.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if not self._flushing and not self.info.get('wrote') and self._is_read(clause):
+                return read_engine
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+    
+    @staticmethod
+    def _is_read(clause):
+        if isinstance(clause, UpdateBase):
+            return False
+        if isinstance(clause, TextClause):
+            # Raw SQL passed to session.execute(text(...)) could be anything
+            return clause.text.lstrip().upper().startswith(('SELECT', 'WITH', 'EXPLAIN'))
+        return True
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _release_writer(session):
+    """The transaction's writes are committed or gone, so reads can use the pool again."""
+    session.info.pop('wrote', None)
 
 # Initialize extensions
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 migrate = Migrate(app, db)
 
+with app.app_context():
+    event.listen(db.engine, 'connect', lambda conn, record: configure_sqlite_connection(conn))
+
+read_engine = create_engine(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=READ_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=30
+)
+event.listen(read_engine, 'connect', lambda conn, record: configure_sqlite_connection(conn, read_only=True))
+
+# SQL Instrumentation
+app.config.setdefault('SQL_SLOW_QUERY_MS', 100)
+app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 5)
+
+slow_query_log = logging.getLogger('databases.slow_queries')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def fingerprint_statement(statement):
+    """Reduce a SQL statement to its shape so repeats of the same query compare equal."""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?+)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info['query_start_time'].pop()) * 1000
+    # sqlite3 only knows the row count for DML; SELECTs report -1 until fetched.
+    # It also steps lazily, so a SELECT's duration covers producing its first row.
+    rows = cursor.rowcount if cursor.rowcount >= 0 else None
+    fingerprint = fingerprint_statement(statement)
+    
+    if duration_ms >= app.config['SQL_SLOW_QUERY_MS']:
+        slow_query_log.warning("Slow query (%.1fms, rows=%s): %s", duration_ms, rows, fingerprint)
+    
+    if has_request_context():
+        if 'sql_queries' not in g:
+            g.sql_queries = []
+        g.sql_queries.append((fingerprint, duration_ms, rows))
+
+@app.after_request
+def _report_request_queries(response):
+    """Flag likely N+1 patterns and expose query stats in debug mode."""
+    queries = g.pop('sql_queries', [])
+    counts = Counter(fingerprint for fingerprint, _, _ in queries)
+    threshold = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+    for fingerprint, count in counts.items():
+        if count > threshold:
+            app.logger.warning("Likely N+1 in %s %s: %d executions of %s",
+                               request.method, request.path, count, fingerprint)
+    
+    if app.debug:
+        response.headers['X-Query-Count'] = str(len(queries))
+        response.headers['X-Query-Time-Ms'] = f"{sum(duration for _, duration, _ in queries):.2f}"
+    return response
+
+with app.app_context():
+    for engine in (db.engine, read_engine):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+# Password Hashing
+# Set PASSWORD_HASH_METHOD (e.g. 'pbkdf2:sha256:600000') to pin the cost across workers
+password_cost = PasswordCost(app.config)
+
 # Model Definitions
 class User(db.Model):
     """User model with relationships to posts and comments."""
@@ -33,18 +185,29 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Maintained by the counter events below; indexed for leaderboard queries
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     
     # Relationships
     posts = db.relationship('Post', backref='author', lazy=True, cascade="all, delete-orphan")
     comments = db.relationship('Comment', backref='author', lazy=True, cascade="all, delete-orphan")
     
     def set_password(self, password):
-        """Hash the password for secure storage."""
-        self.password_hash = generate_password_hash(password)
+        """Hash the password for secure storage using the calibrated cost."""
+        self.password_hash = generate_password_hash(password, method=password_cost.method)
         
     def check_password(self, password):
-        """Verify a password against its hash."""
-        return check_password_hash(self.password_hash, password)
+        """
+        Verify a password against its hash.
+        
+        On success, a hash made with outdated cost parameters is replaced with
+        one using the current method; commit the session to keep it.
+        """
+        if not check_password_hash(self.password_hash, password):
+            return False
+        if password_cost.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def to_dict(self):
         """Convert user object to dictionary."""
@@ -52,7 +215,8 @@ class User(db.Model):
             'id': self.id,
             'username': self.username,
             'email': self.email,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'post_count': self.post_count
         }
     
     def __repr__(self):
@@ -61,6 +225,10 @@ class User(db.Model):
 class Post(db.Model):
     """Blog post model with relationship to comments."""
     __tablename__ = 'posts'
+    __table_args__ = (
+        # Serves "posts by user", newest first, and the User.posts lazy load
+        db.Index('ix_posts_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -68,6 +236,7 @@ class Post(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     
     # Relationships
     comments = db.relationship('Comment', backref='post', lazy=True, cascade="all, delete-orphan")
@@ -81,7 +250,8 @@ class Post(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'user_id': self.user_id,
-            'author': self.author.username
+            'author': self.author.username,
+            'comment_count': self.comment_count
         }
     
     def __repr__(self):
@@ -90,6 +260,11 @@ class Post(db.Model):
 class Comment(db.Model):
     """Comment model for blog posts."""
     __tablename__ = 'comments'
+    __table_args__ = (
+        # Serves "comments on a post" in order, and the Post.comments lazy load
+        db.Index('ix_comments_post_id_created_at', 'post_id', 'created_at'),
+        db.Index('ix_comments_user_id', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -111,24 +286,388 @@ class Comment(db.Model):
     def __repr__(self):
         return f"Comment('{self.content[:20]}...', '{self.created_at}')"
 
+# Query Result Cache
+# One row per table, bumped inside every transaction that writes the table.
+# It lives in the database so all worker processes see the same versions.
+cache_versions = db.Table(
+    'cache_versions',
+    db.Column('table_name', db.String(64), primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0)
+)
+
+def bump_table_versions(connection, *tables):
+    """Invalidate cached results for the given tables, as part of connection's transaction."""
+    stmt = sqlite_insert(cache_versions).values([{'table_name': table, 'version': 1} for table in tables])
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['table_name'],
+        set_={'version': cache_versions.c.version + 1}
+    ))
+
+def load_table_versions(tables):
+    """Current committed version of each table, in order (0 if never written)."""
+    rows = db.session.execute(
+        select(cache_versions.c.table_name, cache_versions.c.version)
+        .where(cache_versions.c.table_name.in_(tables))
+    )
+    versions = dict(rows.all())
+    return tuple(versions.get(table, 0) for table in tables)
+
+class QueryCache:
+    """
+    Bounded LRU cache for read-endpoint results.
+    
+    Every entry remembers the version of each table it was computed from.
+    Writes bump the versions in the cache_versions table, so a lookup whose
+    versions no longer match is treated as a miss, whichever process wrote.
+    Writes that bypass the ORM (raw SQL from another tool) don't bump
+    anything, so entries also expire after max_age seconds.
+    """
+    
+    def __init__(self, load_versions, max_entries=1024, max_age=60):
+        self.load_versions = load_versions
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def get_or_compute(self, key, tables, compute):
+        """Return the cached value for key, computing and storing it on a miss."""
+        # Read the versions before the data. A write committed in between means
+        # the stored data is newer than the versions stored with it, never older,
+        # so the next lookup sees the bumped versions and safely misses.
+        versions = self.load_versions(tables)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == versions and now - entry[1] < self.max_age:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        
+        value = compute()
+        
+        with self.lock:
+            self.entries[key] = (versions, now, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+    
+    def stats(self):
+        """Return hit/miss counters and the current hit ratio."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'max_age': self.max_age,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+query_cache = QueryCache(load_table_versions)
+
+def _bump_during_flush(connection, target, table):
+    """Bump a table's version once per flush, on the flushing connection."""
+    session = object_session(target)
+    bumped = session.info.setdefault('bumped_tables', set()) if session is not None else set()
+    if table not in bumped:
+        bumped.add(table)
+        bump_table_versions(connection, table)
+
+def _record_table_change(mapper, connection, target):
+    """Bump the table version in the transaction that changes it."""
+    _bump_during_flush(connection, target, mapper.persist_selectable.name)
+
+for model in (User, Post, Comment):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, _record_table_change)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _reset_bumped_tables(session, flush_context):
+    session.info.pop('bumped_tables', None)
+
+# Denormalized Counters
+def _adjust_counter(connection, target, column, row_id, delta):
+    """
+    Add delta to a counter column inside the flushing transaction.
+    
+    The UPDATE runs on the same connection as the INSERT/DELETE that caused it,
+    so the counter commits or rolls back together with the row.
+    """
+    table = column.table
+    # Core UPDATEs apply column onupdate defaults; a counter change isn't an
+    # edit of the row, so keep columns like posts.updated_at as they are
+    values = {c.name: c for c in table.columns if c.onupdate is not None}
+    values[column.name] = column + delta
+    connection.execute(table.update().where(table.c.id == row_id).values(values))
+    # Core updates don't fire mapper events, so invalidate the cache here
+    _bump_during_flush(connection, target, table.name)
+
+@event.listens_for(Post, 'after_insert')
+def _increment_post_count(mapper, connection, target):
+    _adjust_counter(connection, target, User.__table__.c.post_count, target.user_id, 1)
+
+@event.listens_for(Post, 'after_delete')
+def _decrement_post_count(mapper, connection, target):
+    _adjust_counter(connection, target, User.__table__.c.post_count, target.user_id, -1)
+
+@event.listens_for(Comment, 'after_insert')
+def _increment_comment_count(mapper, connection, target):
+    _adjust_counter(connection, target, Post.__table__.c.comment_count, target.post_id, 1)
+
+@event.listens_for(Comment, 'after_delete')
+def _decrement_comment_count(mapper, connection, target):
+    _adjust_counter(connection, target, Post.__table__.c.comment_count, target.post_id, -1)
+
+def reconcile_counters():
+    """
+    Recompute every counter from the source tables and repair any drift.
+    
+    Drift can come from bulk statements or raw SQL that bypass the ORM events.
+    Returns the number of rows that were corrected.
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            users_fixed = connection.execute(text("""
+                UPDATE users SET post_count = (
+                    SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id
+                )
+                WHERE post_count != (SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id)
+            """)).rowcount
+            posts_fixed = connection.execute(text("""
+                UPDATE posts SET comment_count = (
+                    SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id
+                )
+                WHERE comment_count != (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+            """)).rowcount
+            bump_table_versions(connection, 'users', 'posts')
+        return users_fixed + posts_fixed
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Repair drifted post/comment counters (run periodically, e.g. from cron)."""
+    print(f"Counters repaired: {reconcile_counters()}")
+
+def check_counter_updates():
+    """
+    Check that maintaining a counter doesn't look like an edit of the row.
+    
+    Adds a user, post and comment in a transaction that is rolled back, and
+    fails if the comment changed its post's updated_at.
+    """
+    with app.app_context():
+        try:
+            user = User(username=f'counter_check_{secrets.token_hex(4)}',
+                        email=f'counter_check_{secrets.token_hex(4)}@example.com')
+            post = Post(title='Counter check', content='Counter check', author=user)
+            db.session.add(post)
+            db.session.flush()
+            before = db.session.execute(select(Post.updated_at).where(Post.id == post.id)).scalar()
+            db.session.add(Comment(content='Counter check', author=user, post=post))
+            db.session.flush()
+            after, comment_count = db.session.execute(
+                select(Post.updated_at, Post.comment_count).where(Post.id == post.id)
+            ).one()
+        finally:
+            db.session.rollback()
+    if comment_count != 1:
+        raise AssertionError(f"comment_count is {comment_count} after one comment, expected 1")
+    if after != before:
+        raise AssertionError(f"Adding a comment changed the post's updated_at from {before} to {after}")
+    print("Counter updates leave updated_at unchanged.")
+
+@app.cli.command('check-counters')
+def check_counter_updates_command():
+    """Fail if maintaining a counter changes the row's updated_at."""
+    check_counter_updates()
+
+def cached_query(*tables):
+    """
+    Cache a read view's result, keyed by endpoint and arguments.
+    
+    The decorated view returns either JSON-serializable data, which the
+    decorator jsonifies, or an already serialized JSON string.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (
+                f.__name__,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True)))
+            )
+            if db.session.info.get('wrote'):
+                # Uncommitted rows could end up cached, so skip the cache entirely
+                result = f(*args, **kwargs)
+            else:
+                result = query_cache.get_or_compute(key, tables, lambda: f(*args, **kwargs))
+            if isinstance(result, str):
+                return Response(result, mimetype='application/json')
+            return jsonify(result)
+        return decorated_function
+    return decorator
+
+# Fast List Serialization
+def compile_row_serializer(fields):
+    """
+    Build a function that turns result rows straight into a JSON array string.
+    
+    fields is a list of (key, column) pairs matching the order of the selected
+    columns. The JSON template and per-column conversions are generated once
+    from the column types and compiled, so serializing a row is a single
+    string-format operation: no model instance, no intermediate dict.
+    """
+    templates = []
+    expressions = []
+    for index, (key, column) in enumerate(fields):
+        value = f"r[{index}]"
+        if isinstance(column.type, db.Integer):
+            template, expression = '%d', value
+        elif isinstance(column.type, db.DateTime):
+            template, expression = '"%s"', f"{value}.isoformat()"
+        else:
+            template, expression = '%s', f"_dumps({value})"
+        if column.nullable:
+            template = '%s'
+            if isinstance(column.type, db.Integer):
+                expression = f"('null' if {value} is None else {value})"
+            elif isinstance(column.type, db.DateTime):
+                expression = f"('null' if {value} is None else '\"' + {value}.isoformat() + '\"')"
+        templates.append(f'"{key}":{template}')
+        expressions.append(expression)
+    
+    row_template = '{' + ','.join(templates) + '}'
+    source = (
+        "def serialize(rows):\n"
+        f"    return '[' + ','.join([{row_template!r} % ({', '.join(expressions)},) for r in rows]) + ']'\n"
+    )
+    namespace = {'_dumps': json.dumps}
+    exec(compile(source, '<row serializer>', 'exec'), namespace)
+    return namespace['serialize']
+
+USER_LIST_FIELDS = [
+    ('id', User.id),
+    ('username', User.username),
+    ('email', User.email),
+    ('created_at', User.created_at),
+    ('post_count', User.post_count)
+]
+
+POST_LIST_FIELDS = [
+    ('id', Post.id),
+    ('title', Post.title),
+    ('content', Post.content),
+    ('created_at', Post.created_at),
+    ('updated_at', Post.updated_at),
+    ('user_id', Post.user_id),
+    ('author', User.username),
+    ('comment_count', Post.comment_count)
+]
+
+serialize_user_rows = compile_row_serializer(USER_LIST_FIELDS)
+serialize_post_rows = compile_row_serializer(POST_LIST_FIELDS)
+
+def _select_fields(fields):
+    return select(*(column for _, column in fields))
+
+# Uniqueness Pre-checks
+class UniqueValueIndex:
+    """
+    Bloom filter in front of a UNIQUE column.
+    
+    A definite miss skips the SELECT entirely; a possible hit falls back to the
+    database. The UNIQUE constraint still decides on insert, so a stale or
+    lossy filter can only cost an extra query, never a duplicate row.
+    
+    The filter is sized from the row count when it is loaded and rebuilt
+    once more values have been added than it was sized for.
+    """
+    
+    def __init__(self, column, error_rate=0.01):
+        self.column = column
+        self.error_rate = error_rate
+        self.filter = BloomFilter.for_count(0, error_rate)
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.checks = 0
+        self.selects_saved = 0
+        self.false_positives = 0
+    
+    def load(self):
+        """Build a filter sized for the existing rows and populate it."""
+        with self.lock:
+            count = db.session.query(db.func.count()).select_from(self.column.table).scalar()
+            bloom = BloomFilter.for_count(count, self.error_rate)
+            for (value,) in db.session.query(self.column):
+                bloom.add(value)
+            self.filter = bloom
+            self.loaded = True
+    
+    def add(self, value):
+        with self.lock:
+            self.filter.add(value)
+            if self.filter.full:
+                # The next check rebuilds it from the table at twice the size
+                self.loaded = False
+    
+    def exists(self, value):
+        """Return True if a row with this value exists, querying only when needed."""
+        if not self.loaded:
+            self.load()
+        self.checks += 1
+        if value not in self.filter:
+            self.selects_saved += 1
+            return False
+        found = db.session.query(self.column).filter(self.column == value).first() is not None
+        if not found:
+            self.false_positives += 1
+        return found
+    
+    def stats(self):
+        # Every value that wasn't found was either a definite miss or a false positive
+        absent = self.selects_saved + self.false_positives
+        return {
+            'checks': self.checks,
+            'selects_saved': self.selects_saved,
+            'false_positives': self.false_positives,
+            'false_positive_rate': self.false_positives / absent if absent else 0.0
+        }
+
+username_index = UniqueValueIndex(User.username)
+email_index = UniqueValueIndex(User.email)
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def _add_user_to_unique_indexes(mapper, connection, target):
+    """Keep the filters current; values from rolled-back inserts only become false positives."""
+    username_index.add(target.username)
+    email_index.add(target.email)
+
 # API Routes for CRUD operations
 @app.route('/api/users', methods=['GET'])
+@cached_query('users')
 def get_users():
     """Get all users or filter by username."""
     username = request.args.get('username')
     
+    # Select just the listed columns; rows are serialized without building models
+    query = _select_fields(USER_LIST_FIELDS)
     if username:
-        users = User.query.filter(User.username.like(f'%{username}%')).all()
-    else:
-        users = User.query.all()
+        query = query.where(User.username.like(f'%{username}%'))
         
-    return jsonify([user.to_dict() for user in users])
+    return serialize_user_rows(db.session.execute(query))
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
+@cached_query('users')
 def get_user(user_id):
     """Get a specific user by ID."""
     user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
+    return user.to_dict()
 
 @app.route('/api/users', methods=['POST'])
 def create_user():
@@ -138,31 +677,134 @@ def create_user():
     if not data or not data.get('username') or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Invalid data'}), 400
     
-    if User.query.filter_by(username=data['username']).first():
+    if username_index.exists(data['username']):
         return jsonify({'error': 'Username already exists'}), 400
         
-    if User.query.filter_by(email=data['email']).first():
+    if email_index.exists(data['email']):
         return jsonify({'error': 'Email already exists'}), 400
     
     user = User(username=data['username'], email=data['email'])
     user.set_password(data['password'])
     
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent signup; the UNIQUE constraint has the final say
+        db.session.rollback()
+        return jsonify({'error': 'Username or email already exists'}), 400
     
     return jsonify(user.to_dict()), 201
 
 @app.route('/api/posts', methods=['GET'])
+@cached_query('posts', 'users')
 def get_posts():
     """Get all posts or filter by title."""
     title = request.args.get('title')
     
+    # The author comes from a join rather than one lazy load per post
+    query = _select_fields(POST_LIST_FIELDS).join(User, Post.user_id == User.id)
     if title:
-        posts = Post.query.filter(Post.title.like(f'%{title}%')).all()
-    else:
-        posts = Post.query.all()
+        query = query.where(Post.title.like(f'%{title}%'))
         
-    return jsonify([post.to_dict() for post in posts])
+    return serialize_post_rows(db.session.execute(query))
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = ('id', 'title', 'content', 'created_at', 'updated_at', 'user_id', 'author')
+
+def _export_batches():
+    """
+    Yield posts as lists of plain row tuples, EXPORT_BATCH_SIZE at a time.
+    
+    The query selects columns rather than entities, so no ORM objects are
+    built, and yield_per streams from the cursor instead of buffering the
+    whole result. Memory stays bounded by one batch whatever the table size.
+    """
+    query = (
+        select(Post.id, Post.title, Post.content, Post.created_at, Post.updated_at,
+               Post.user_id, User.username)
+        .join(User, Post.user_id == User.id)
+        .order_by(Post.id)
+    )
+    with read_engine.connect() as connection:
+        result = connection.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(query)
+        for batch in result.partitions():
+            yield batch
+
+def _isoformat(value):
+    # Timestamps are nullable; None becomes null in NDJSON and an empty CSV field
+    return None if value is None else value.isoformat()
+
+def _format_ndjson(batch):
+    return ''.join(
+        json.dumps({
+            'id': row[0],
+            'title': row[1],
+            'content': row[2],
+            'created_at': _isoformat(row[3]),
+            'updated_at': _isoformat(row[4]),
+            'user_id': row[5],
+            'author': row[6]
+        }) + '\n'
+        for row in batch
+    )
+
+def _format_csv(batch):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (row[0], row[1], row[2], _isoformat(row[3]), _isoformat(row[4]), row[5], row[6])
+        for row in batch
+    )
+    return buffer.getvalue()
+
+@app.route('/api/posts/export', methods=['GET'])
+def export_posts():
+    """Stream every post as NDJSON or CSV without loading the table into memory."""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        formatter, mimetype = _format_ndjson, 'application/x-ndjson'
+    elif export_format == 'csv':
+        formatter, mimetype = _format_csv, 'text/csv'
+    else:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    def generate():
+        started = time.perf_counter()
+        rows = 0
+        if export_format == 'csv':
+            yield ','.join(EXPORT_COLUMNS) + '\r\n'
+        for batch in _export_batches():
+            rows += len(batch)
+            yield formatter(batch)
+        elapsed = time.perf_counter() - started
+        app.logger.info("Exported %d posts as %s in %.2fs (%.0f rows/s)",
+                        rows, export_format, elapsed, rows / elapsed if elapsed else 0)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=posts.{export_format}'}
+    )
+
+@app.route('/api/users/top', methods=['GET'])
+@cached_query('users')
+def get_top_users():
+    """Get the users with the most posts (an index scan on post_count)."""
+    # SQLite treats a negative LIMIT as no limit, so clamp both ends
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    users = User.query.order_by(User.post_count.desc()).limit(limit).all()
+    return [user.to_dict() for user in users]
+
+@app.route('/api/posts/top', methods=['GET'])
+@cached_query('posts', 'users')
+def get_top_posts():
+    """Get the most commented posts (an index scan on comment_count)."""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    # to_dict() reads post.author, so load authors in the same query (avoids N+1)
+    posts = Post.query.options(joinedload(Post.author)).order_by(Post.comment_count.desc()).limit(limit).all()
+    return [post.to_dict() for post in posts]
 
 @app.route('/api/users/<int:user_id>/posts', methods=['POST'])
 def create_post(user_id):
@@ -184,11 +826,184 @@ def create_post(user_id):
     
     return jsonify(post.to_dict()), 201
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report query cache hit ratio and table versions."""
+    return jsonify(query_cache.stats())
+
+@app.route('/api/users/uniqueness/stats', methods=['GET'])
+def uniqueness_stats():
+    """Report SELECTs saved and observed false-positive rate of the signup filters."""
+    return jsonify({'username': username_index.stats(), 'email': email_index.stats()})
+
 # Database Management Operations
+COUNTER_COLUMNS = [
+    ('users', 'post_count'),
+    ('posts', 'comment_count')
+]
+
+def upgrade_schema():
+    """
+    Bring a database created by an older version of this module up to date.
+    
+    create_all() only creates missing tables, so columns and indexes added to
+    existing models are applied here. Newly added counters are backfilled.
+    """
+    with app.app_context():
+        added = False
+        # The writer pool holds a single connection, so inspect through it too
+        with db.engine.begin() as connection:
+            inspector = inspect(connection)
+            for table, column in COUNTER_COLUMNS:
+                existing = {col['name'] for col in inspector.get_columns(table)}
+                if column not in existing:
+                    connection.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+                    ))
+                    added = True
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+        if added:
+            reconcile_counters()
+
+PLAN_CHECK_ALLOWED_SCANS = {
+    # Unbounded listings read every row by design
+    'GET /api/users',
+    'GET /api/posts',
+    # Leading-wildcard LIKE can't use a B-tree index
+    'GET /api/users?username=a',
+    'GET /api/posts?title=a',
+}
+
+def _seed_plan_check_data(users=2000, posts=20000, comments=60000):
+    """Bulk insert enough rows that the planner's choices matter."""
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'username': f'plan_user_{i}', 'email': f'plan_user_{i}@example.com', 'created_at': now}
+            for i in range(users)
+        ])
+        user_ids = [row[0] for row in connection.execute(text("SELECT id FROM users"))]
+        connection.execute(Post.__table__.insert(), [
+            {'title': f'Post {i}', 'content': 'Lorem ipsum', 'user_id': random.choice(user_ids),
+             'created_at': now, 'updated_at': now}
+            for i in range(posts)
+        ])
+        post_ids = [row[0] for row in connection.execute(text("SELECT id FROM posts"))]
+        connection.execute(Comment.__table__.insert(), [
+            {'content': f'Comment {i}', 'user_id': random.choice(user_ids),
+             'post_id': random.choice(post_ids), 'created_at': now}
+            for i in range(comments)
+        ])
+        connection.execute(text("ANALYZE"))
+    reconcile_counters()
+
+def check_query_plans(allowed_scans=PLAN_CHECK_ALLOWED_SCANS):
+    """
+    Run EXPLAIN QUERY PLAN for every statement the API issues and fail on full scans.
+    
+    Each endpoint is exercised through the test client while the SQL it sends
+    is captured. A plan step that scans a table without an index, or sorts
+    with a temporary B-tree, is reported unless the endpoint is listed in
+    allowed_scans.
+    
+    The check seeds a large dataset, so it runs in a child process whose
+    FLASK_DB_PATH points at a throwaway database; the configured database
+    is never touched.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ, FLASK_DB_PATH=os.path.join(scratch, 'plan_check.sqlite'))
+        script = (
+            "import sys, databases\n"
+            f"sys.exit(databases._check_query_plans_here({sorted(allowed_scans)!r}))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    if result.returncode != 0:
+        raise AssertionError(result.stderr.strip())
+
+def _check_query_plans_here(allowed_scans):
+    """Run the plan check against the configured database; returns the failures or None."""
+    initialize_db()
+    with app.app_context():
+        _seed_plan_check_data()
+    
+    captured = []
+    current = {'label': None}
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            captured.append((current['label'], statement, parameters))
+    
+    with app.app_context():
+        engines = (db.engine, read_engine)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            client = app.test_client()
+            user_id = db.session.query(User.id).order_by(User.post_count.desc()).limit(1).scalar()
+            requests_to_check = [
+                ('GET', '/api/users', None),
+                ('GET', f'/api/users/{user_id}', None),
+                ('GET', '/api/users?username=a', None),
+                ('GET', '/api/users/top', None),
+                ('GET', '/api/posts', None),
+                ('GET', '/api/posts?title=a', None),
+                ('GET', '/api/posts/top', None),
+                ('POST', '/api/users', {'username': 'plan_check', 'email': 'plan_check@example.com',
+                                        'password': 'password123'}),
+                ('POST', f'/api/users/{user_id}/posts', {'title': 'Plan check', 'content': 'Plan check'}),
+            ]
+            for method, url, body in requests_to_check:
+                current['label'] = f'{method} {url}'
+                client.open(url, method=method, json=body)
+            
+            # Deleting a user cascades through the posts and comments relationships
+            current['label'] = 'DELETE user'
+            db.session.delete(db.session.get(User, user_id))
+            db.session.commit()
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', capture)
+        
+        failures = []
+        explained = set()
+        with db.engine.connect() as connection:
+            for label, statement, parameters in captured:
+                if label in allowed_scans or (label, statement) in explained:
+                    continue
+                explained.add((label, statement))
+                plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                for row in plan:
+                    detail = row[-1]
+                    full_scan = detail.startswith('SCAN ') and 'INDEX' not in detail
+                    if full_scan or 'USE TEMP B-TREE' in detail:
+                        failures.append(f"{label}: {detail}\n    {' '.join(statement.split())}")
+        db.session.rollback()
+    
+    if failures:
+        return "Queries without a usable index:\n" + "\n".join(failures)
+    print(f"Checked {len(explained)} distinct statements, no unexpected full scans.")
+    return None
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any API query plan contains an unexpected full table scan."""
+    check_query_plans()
+
 def initialize_db():
     """Initialize the database with tables."""
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        username_index.load()
+        email_index.load()
         print("Database tables created.")
 
 def seed_sample_data():
@@ -237,6 +1052,101 @@ def seed_sample_data():
         
         print("Sample data added to the database.")
 
+def benchmark_concurrency(thread_counts=(1, 2, 4, 8, 16), duration=2.0, write_ratio=0.05):
+    """
+    Measure mixed read/write throughput at increasing thread counts.
+    
+    Each thread runs in its own app context, mostly reading users by primary
+    key and occasionally inserting a post. Run it against a scratch database
+    (set FLASK_DB_PATH) because it writes rows.
+    """
+    initialize_db()
+    seed_sample_data()
+    with app.app_context():
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).all()]
+    
+    results = []
+    for thread_count in thread_counts:
+        counters = {'reads': 0, 'writes': 0, 'errors': 0}
+        counter_lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        
+        def worker():
+            reads = writes = errors = 0
+            with app.app_context():
+                while time.perf_counter() < deadline:
+                    try:
+                        if random.random() < write_ratio:
+                            db.session.add(Post(title='Benchmark', content='Benchmark post',
+                                                user_id=random.choice(user_ids)))
+                            db.session.commit()
+                            writes += 1
+                        else:
+                            db.session.get(User, random.choice(user_ids))
+                            db.session.commit()
+                            reads += 1
+                    except Exception:
+                        db.session.rollback()
+                        errors += 1
+                db.session.remove()
+            with counter_lock:
+                counters['reads'] += reads
+                counters['writes'] += writes
+                counters['errors'] += errors
+        
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        ops = counters['reads'] + counters['writes']
+        results.append({'threads': thread_count, 'ops_per_sec': ops / duration, **counters})
+        print(f"{thread_count:>3} threads: {ops / duration:>10.0f} ops/s "
+              f"(reads={counters['reads']}, writes={counters['writes']}, errors={counters['errors']})")
+    return results
+
+def benchmark_list_serialization(rows=100000):
+    """
+    Compare the ORM + to_dict() list path with the column-select fast path.
+    
+    Both paths build the full JSON body for the first `rows` posts. Reports
+    wall time and peak traced memory for each. Needs that many posts in the
+    database; seed a scratch database (FLASK_DB_PATH) with synthetic_data.py
+    from the Python Beginner Refresher/Database folder.
+    """
+    with app.app_context():
+        available = db.session.query(Post.id).count()
+        if available < rows:
+            print(f"Only {available} posts in the database; benchmarking with those.")
+            rows = available
+        
+        def orm_path():
+            posts = Post.query.order_by(Post.id).limit(rows).all()
+            return json.dumps([post.to_dict() for post in posts])
+        
+        def fast_path():
+            query = (_select_fields(POST_LIST_FIELDS).join(User, Post.user_id == User.id)
+                     .order_by(Post.id).limit(rows))
+            return serialize_post_rows(db.session.execute(query))
+        
+        results = {}
+        for name, path in (('orm + to_dict', orm_path), ('columns + compiled serializer', fast_path)):
+            db.session.expunge_all()
+            tracemalloc.start()
+            started = time.perf_counter()
+            body = path()
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = (elapsed, peak)
+            print(f"{name:<32} {elapsed:>7.2f}s  peak {peak / 1e6:>7.1f}MB  body {len(body) / 1e6:.1f}MB")
+            db.session.rollback()
+        
+        (orm_time, orm_peak), (fast_time, fast_peak) = results.values()
+        print(f"Speedup: {orm_time / fast_time:.1f}x, memory reduction: {orm_peak / fast_peak:.1f}x")
+        return results
+
 if __name__ == "__main__":
     # Initialize and seed the database when run directly
     print("SQLAlchemy Database Example")
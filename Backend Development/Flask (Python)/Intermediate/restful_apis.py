@@ -8,71 +8,250 @@ including proper status codes, request validation, and response formatting.
 
 from flask import Flask, jsonify, request, abort, make_response
 from functools import wraps
+from bisect import bisect_left
 import uuid
 import datetime
+import random
+import time
 from http import HTTPStatus
 
 app = Flask(__name__)
 
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp, treating a trailing Z or no offset as UTC."""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+class TodoStore:
+    """
+    In-memory todo storage with two indexes.
+    
+    A dict keyed by id makes lookups, updates and deletes O(1), and parallel
+    lists sorted by created_at let time-range queries bisect to the matching
+    slice instead of checking every todo.
+    """
+    
+    def __init__(self, todos=()):
+        self.by_id = {}
+        self.created_keys = []
+        self.created_ids = []
+        for todo in todos:
+            self.add(todo)
+    
+    def __len__(self):
+        return len(self.by_id)
+    
+    def add(self, todo):
+        created_at = parse_timestamp(todo['created_at'])
+        self.by_id[todo['id']] = todo
+        # New todos are the newest, so this is normally an append
+        position = bisect_left(self.created_keys, created_at)
+        while position < len(self.created_keys) and self.created_keys[position] == created_at:
+            position += 1
+        self.created_keys.insert(position, created_at)
+        self.created_ids.insert(position, todo['id'])
+    
+    def get(self, todo_id):
+        return self.by_id.get(todo_id)
+    
+    def delete(self, todo_id):
+        todo = self.by_id.pop(todo_id, None)
+        if todo is None:
+            return False
+        position = bisect_left(self.created_keys, parse_timestamp(todo['created_at']))
+        # Step past other todos created at the same instant
+        while self.created_ids[position] != todo_id:
+            position += 1
+        del self.created_keys[position]
+        del self.created_ids[position]
+        return True
+    
+    def all(self):
+        return list(self.by_id.values())
+    
+    def created_between(self, since=None, until=None):
+        """Todos with since <= created_at < until, oldest first."""
+        start = bisect_left(self.created_keys, since) if since else 0
+        end = bisect_left(self.created_keys, until) if until else len(self.created_keys)
+        return [self.by_id[todo_id] for todo_id in self.created_ids[start:end]]
+
 # Simulated database
-todos = [
+todos = TodoStore([
     {'id': '1', 'task': 'Learn Flask', 'done': False, 'created_at': '2023-01-15T10:30:00Z'},
     {'id': '2', 'task': 'Build a RESTful API', 'done': False, 'created_at': '2023-01-16T14:45:00Z'}
-]
-
-# Custom decorators for request validation
-def validate_todo_data(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        data = request.get_json()
-        
-        # Check if data exists and has required fields
-        if not data or 'task' not in data:
-            return make_response(jsonify({'error': 'Invalid data'}), HTTPStatus.BAD_REQUEST)
-        return f(*args, **kwargs)
-    return decorated_function
-
-# Get all todos
+])
+
+# Declarative request schemas
+class Field:
+    """Describes one JSON field: its exact type, whether it's required and a max length."""
+    
+    def __init__(self, type_, required=False, max_length=None):
+        self.type = type_
+        self.required = required
+        self.max_length = max_length
+
+def compile_schema(fields):
+    """
+    Compile a {name: Field} mapping into a validation function.
+    
+    Everything that doesn't depend on the request (allowed and required key
+    sets, the per-field checks) is worked out once here, so validating a body
+    is a few set operations and one pass over the fields. The returned
+    function takes the parsed JSON and returns (data, errors), where data
+    holds only the declared fields.
+    """
+    allowed = frozenset(fields)
+    required = frozenset(name for name, field in fields.items() if field.required)
+    checks = tuple((name, field.type, field.max_length) for name, field in fields.items())
+    
+    def validate(body):
+        if not isinstance(body, dict):
+            return None, ['Request body must be a JSON object']
+        errors = []
+        keys = body.keys()
+        unknown = keys - allowed
+        if unknown:
+            errors.append(f"Unknown fields: {', '.join(sorted(unknown))}")
+        missing = required - keys
+        if missing:
+            errors.append(f"Missing fields: {', '.join(sorted(missing))}")
+        data = {}
+        for name, type_, max_length in checks:
+            if name not in body:
+                continue
+            value = body[name]
+            # Exact type match, so True isn't accepted where an int is expected
+            if type(value) is not type_:
+                errors.append(f"{name} must be of type {type_.__name__}")
+            elif max_length is not None and len(value) > max_length:
+                errors.append(f"{name} must be at most {max_length} characters")
+            else:
+                data[name] = value
+        return data, errors
+    
+    return validate
+
+def validate_json(schema):
+    """Parse the JSON body once, validate it and pass the result to the view as `data`."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            data, errors = schema(request.get_json(silent=True))
+            if errors:
+                return make_response(jsonify({'error': 'Invalid data', 'details': errors}), HTTPStatus.BAD_REQUEST)
+            return f(*args, data=data, **kwargs)
+        return decorated_function
+    return decorator
+
+todo_schema = compile_schema({
+    'task': Field(str, required=True, max_length=200),
+    'done': Field(bool)
+})
+
+# Get all todos, optionally only those created in [since, until)
 @app.route('/api/todos', methods=['GET'])
 def get_todos():
-    return jsonify(todos), HTTPStatus.OK
+    since = request.args.get('since')
+    until = request.args.get('until')
+    if since is None and until is None:
+        return jsonify(todos.all()), HTTPStatus.OK
+    try:
+        since = parse_timestamp(since) if since else None
+        until = parse_timestamp(until) if until else None
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO 8601 timestamps'}), HTTPStatus.BAD_REQUEST
+    return jsonify(todos.created_between(since, until)), HTTPStatus.OK
 
 # Get a single todo by ID
 @app.route('/api/todos/<string:todo_id>', methods=['GET'])
 def get_todo(todo_id):
-    todo = next((todo for todo in todos if todo['id'] == todo_id), None)
+    todo = todos.get(todo_id)
     if todo is not None:
         return jsonify(todo), HTTPStatus.OK
     return jsonify({'error': 'Todo not found'}), HTTPStatus.NOT_FOUND
 
 # Create a new todo
 @app.route('/api/todos', methods=['POST'])
-@validate_todo_data
-def create_todo():
-    new_todo = request.get_json()
-    new_todo['id'] = str(uuid.uuid4())
-    new_todo['done'] = False
-    new_todo['created_at'] = datetime.datetime.utcnow().isoformat() + 'Z'
-    todos.append(new_todo)
+@validate_json(todo_schema)
+def create_todo(data):
+    new_todo = {
+        'id': str(uuid.uuid4()),
+        'task': data['task'],
+        'done': data.get('done', False),
+        'created_at': datetime.datetime.utcnow().isoformat() + 'Z'
+    }
+    todos.add(new_todo)
     return jsonify(new_todo), HTTPStatus.CREATED
 
 # Update an existing todo
 @app.route('/api/todos/<string:todo_id>', methods=['PUT'])
-@validate_todo_data
-def update_todo(todo_id):
-    todo = next((todo for todo in todos if todo['id'] == todo_id), None)
+@validate_json(todo_schema)
+def update_todo(todo_id, data):
+    todo = todos.get(todo_id)
     if todo is not None:
-        updated_data = request.get_json()
-        todo.update(updated_data)
+        # Only validated fields are applied, so id and created_at can't be overwritten
+        todo.update(data)
         return jsonify(todo), HTTPStatus.OK
     return jsonify({'error': 'Todo not found'}), HTTPStatus.NOT_FOUND
 
 # Delete a todo
 @app.route('/api/todos/<string:todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
-    global todos
-    todos = [todo for todo in todos if todo['id'] != todo_id]
+    todos.delete(todo_id)
     return jsonify({'result': 'Todo deleted'}), HTTPStatus.NO_CONTENT
 
+def benchmark_validation(iterations=200000):
+    """Measure how many request bodies per second the compiled todo schema validates."""
+    bodies = [
+        {'task': 'Write the benchmark', 'done': False},
+        {'task': 'x' * 500},
+        {'task': 'Unknown field', 'owner': 'alice'},
+        {'done': 'yes'}
+    ]
+    for body in bodies:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            todo_schema(body)
+        rate = iterations / (time.perf_counter() - started)
+        print(f"{rate:>12,.0f} validations/s  {todo_schema(body)[1] or 'valid'}")
+
+def benchmark_store(size=1000000, lookups=1000):
+    """Compare indexed lookups and range queries with linear scans over `size` todos."""
+    start = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    items = [
+        {'id': str(uuid.uuid4()), 'task': f'Task {i}', 'done': False,
+         'created_at': (start + datetime.timedelta(seconds=i)).isoformat().replace('+00:00', 'Z')}
+        for i in range(size)
+    ]
+    started = time.perf_counter()
+    store = TodoStore(items)
+    print(f"Built store of {size:,} todos in {time.perf_counter() - started:.2f}s")
+    
+    sample = [random.choice(items)['id'] for _ in range(lookups)]
+    scans = max(1, lookups // 100)
+    
+    started = time.perf_counter()
+    for todo_id in sample[:scans]:
+        next(todo for todo in items if todo['id'] == todo_id)
+    scan_time = (time.perf_counter() - started) / scans
+    started = time.perf_counter()
+    for todo_id in sample:
+        store.get(todo_id)
+    index_time = (time.perf_counter() - started) / lookups
+    print(f"Lookup by id:  scan {scan_time * 1e6:>10.1f}us  index {index_time * 1e6:>8.2f}us")
+    
+    since = start + datetime.timedelta(seconds=size // 2)
+    until = since + datetime.timedelta(hours=1)
+    started = time.perf_counter()
+    scanned = [todo for todo in items if since <= parse_timestamp(todo['created_at']) < until]
+    scan_time = time.perf_counter() - started
+    started = time.perf_counter()
+    indexed = store.created_between(since, until)
+    index_time = time.perf_counter() - started
+    assert scanned == indexed
+    print(f"Range query ({len(indexed)} todos):  scan {scan_time * 1e3:>8.1f}ms  index {index_time * 1e3:>6.3f}ms")
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -1,7 +1,22 @@
 from flask import Flask, jsonify, request
+import os
+import sys
+
+# asset_pipeline.py sits in Projects/ and is shared by every project. The
+# project directories aren't packages (their names contain spaces), so it can't
+# be imported relatively; put Projects/ on the path so this runs from anywhere,
+# e.g. `python "Projects/Todo App/backend/app.py"`. Appending keeps an installed
+# module or a PYTHONPATH entry ahead of it.
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')))
+import asset_pipeline
 
 app = Flask(__name__)
 
+# Serve the frontend built by `python Projects/asset_pipeline.py`: hashed
+# assets are cached for a year and sent gzipped when the browser accepts it
+FRONTEND_DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist')
+asset_pipeline.init_app(app, FRONTEND_DIST)
+
 # In-memory storage for the todo items
 todos = []
 
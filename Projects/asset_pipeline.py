@@ -0,0 +1,222 @@
+"""
+Static Asset Pipeline
+=====================
+
+A small build step for the project frontends. Browsers revalidate unversioned
+assets like app.js on every page load; once a file's name changes whenever its
+content does, it can be cached forever instead.
+
+build() copies a frontend into a dist/ directory where:
+
+- every asset is renamed with a hash of its content: app.js -> app.3f2a1b9c0d.js
+- text assets get a precompressed .gz variant next to them, so the server
+  never compresses on the fly
+- references to assets in HTML and CSS files are rewritten to the hashed names
+- manifest.json maps each original name to its hashed name
+
+init_app() serves a dist/ directory from Flask: hashed files with a one-year
+immutable Cache-Control, HTML and other unhashed files with no-cache, and the
+.gz variant whenever the client accepts gzip. It also adds an asset_url()
+template global that resolves names through the manifest.
+
+Old hashed files are left in place on rebuild, so pages already loaded by
+clients keep working during a deploy.
+
+Usage:
+    python asset_pipeline.py                      # build every project frontend
+    python asset_pipeline.py "Todo App/frontend"  # build one directory
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 10
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# HTML pages are the entry points: they keep their names and are never cached
+PAGE_EXTENSIONS = {'.html'}
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.map', '.xml'}
+# Compressing tiny files saves nothing once headers are counted
+MIN_COMPRESS_SIZE = 256
+
+HTML_REFERENCE = re.compile(r'''(?P<before>\b(?:src|href)\s*=\s*["'])(?P<url>[^"'#?]+)''')
+CSS_REFERENCE = re.compile(r'''(?P<before>\burl\(\s*["']?)(?P<url>[^"')#?]+)''')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name, data):
+    """app.js -> app.<hash>.js"""
+    root, extension = os.path.splitext(name)
+    return f"{root}.{content_hash(data)}{extension}"
+
+
+def rewrite_references(text, pattern, base, manifest):
+    """Replace relative references to known assets with their hashed names."""
+    def replace(match):
+        url = match.group('url')
+        if '://' in url or url.startswith(('/', 'data:')):
+            return match.group(0)
+        name = os.path.normpath(os.path.join(base, url)).replace(os.sep, '/')
+        if name not in manifest:
+            return match.group(0)
+        hashed = os.path.relpath(manifest[name], base or '.').replace(os.sep, '/')
+        return match.group('before') + hashed
+    return pattern.sub(replace, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+        # mtime=0 keeps rebuilds of the same content byte-identical
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            with open(path + '.gz', 'wb') as f:
+                f.write(compressed)
+
+
+def build(source_dir, output_dir=None):
+    """
+    Build source_dir into output_dir (default: source_dir/dist).
+
+    Returns the manifest: {original name: hashed name}, with names relative
+    to the directory and using forward slashes.
+    """
+    output_dir = output_dir or os.path.join(source_dir, 'dist')
+    output_abs = os.path.abspath(output_dir)
+
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs
+                         if os.path.abspath(os.path.join(root, d)) != output_abs and not d.startswith('.'))
+        for filename in sorted(names):
+            if filename.startswith('.') or filename.endswith('.gz'):
+                continue
+            path = os.path.join(root, filename)
+            files.append(os.path.relpath(path, source_dir).replace(os.sep, '/'))
+
+    def read(name):
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            return f.read()
+
+    def extension(name):
+        return os.path.splitext(name)[1].lower()
+
+    manifest = {}
+    # CSS can reference images and fonts, so it's hashed after everything it
+    # might point to, and pages are rewritten last
+    assets = [name for name in files if extension(name) not in PAGE_EXTENSIONS | {'.css'}]
+    stylesheets = [name for name in files if extension(name) == '.css']
+    pages = [name for name in files if extension(name) in PAGE_EXTENSIONS]
+
+    for name in assets + stylesheets:
+        data = read(name)
+        if name in stylesheets:
+            text = rewrite_references(data.decode('utf-8'), CSS_REFERENCE, os.path.dirname(name), manifest)
+            data = text.encode('utf-8')
+        manifest[name] = hashed_name(name, data)
+        _write(os.path.join(output_dir, manifest[name]), data)
+
+    for name in pages:
+        text = rewrite_references(read(name).decode('utf-8'), HTML_REFERENCE, os.path.dirname(name), manifest)
+        _write(os.path.join(output_dir, name), text.encode('utf-8'))
+
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(dist_dir):
+    try:
+        with open(os.path.join(dist_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app, dist_dir, url_prefix='', endpoint='asset'):
+    """
+    Serve a built dist_dir from a Flask app under url_prefix.
+
+    '<url_prefix>/' serves index.html. Without a build (no manifest), files
+    are served under their own names with no-cache.
+    """
+    dist_dir = os.path.abspath(dist_dir)
+    manifest = load_manifest(dist_dir)
+    immutable = set(manifest.values())
+
+    def asset(filename='index.html'):
+        path = safe_join(dist_dir, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        compressed = path + '.gz'
+        use_gzip = request.accept_encodings['gzip'] > 0 and os.path.isfile(compressed)
+        hashed = filename in immutable
+        # Without a max_age, send_file marks the response no-cache
+        response = send_file(compressed if use_gzip else path, mimetype=mimetype,
+                             conditional=True, max_age=ONE_YEAR if hashed else None)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        if hashed:
+            response.cache_control.immutable = True
+        return response
+
+    app.add_url_rule(f'{url_prefix}/', endpoint, asset)
+    app.add_url_rule(f'{url_prefix}/<path:filename>', endpoint, asset)
+
+    @app.template_global()
+    def asset_url(name):
+        """URL of an asset by its original name, e.g. {{ asset_url('app.js') }}."""
+        return url_for(endpoint, filename=manifest.get(name, name))
+
+    return manifest
+
+
+def project_frontends(projects_dir):
+    """Each project's frontend/ directory, or the project itself if it has none."""
+    for project in sorted(os.listdir(projects_dir)):
+        path = os.path.join(projects_dir, project)
+        if not os.path.isdir(path) or project.startswith(('.', '_')):
+            continue
+        frontend = os.path.join(path, 'frontend')
+        yield frontend if os.path.isdir(frontend) else path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress frontend assets.")
+    parser.add_argument('sources', nargs='*', help="Frontend directories (default: every project)")
+    parser.add_argument('--clean', action='store_true', help="Remove each dist/ directory first")
+    args = parser.parse_args()
+
+    sources = args.sources or list(project_frontends(os.path.dirname(os.path.abspath(__file__))))
+    for source in sources:
+        output_dir = os.path.join(source, 'dist')
+        if args.clean:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        manifest = build(source, output_dir)
+        print(f"{source}: {len(manifest)} assets -> {output_dir}")
+        for name, hashed in manifest.items():
+            print(f"  {name} -> {hashed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,37 +8,285 @@ SQLite is a lightweight disk-based database that doesn't require a separate serv
 
 import sqlite3
 import os
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import islice
+
+import synthetic_data
+
+
+# Named pragma profiles. Every profile uses WAL: the journal mode is stored in
+# the database file and leaving WAL needs exclusive access, so keeping it
+# fixed lets a connection switch profiles while others are open.
+#
+# - durable: fsync on every commit; nothing committed is lost on power failure
+# - balanced: fsync only at checkpoints; a crash can lose the last commits but
+#   never corrupts the database. A good default for services.
+# - bulk-load: no fsync, a large cache and no automatic checkpoints while
+#   importing; the WAL is checkpointed when the profile is left. Use it
+#   through SQLiteExample.use_profile("bulk-load").
+#
+# cache_size is negative in KiB (-64000 is about 64 MB); mmap_size is bytes.
+PRAGMA_PROFILES = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "wal_autocheckpoint": 1000,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 0,
+    },
+}
+
+
+def configure_connection(connection, pragmas=None):
+    """Apply the settings every connection needs, plus any extra pragmas."""
+    # Enable foreign keys
+    connection.execute("PRAGMA foreign_keys = ON")
+    # Set the row factory to return rows as dictionaries
+    connection.row_factory = sqlite3.Row
+    for name, value in (pragmas or {}).items():
+        connection.execute(f"PRAGMA {name} = {value}")
+    return connection
+
+
+def fts_query(search_term, prefix=True):
+    """
+    Turn free text into an FTS5 query that matches all of its words.
+    
+    Each word is quoted, so characters with a meaning in FTS5 syntax (AND,
+    OR, NEAR, -, *, quotes) are searched literally instead of raising a
+    syntax error. Returns None if the text has no words.
+    """
+    words = re.findall(r"\w+", search_term)
+    if not words:
+        return None
+    query = " ".join(f'"{word}"' for word in words)
+    return query + "*" if prefix else query
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of configured sqlite3 connections.
+    
+    A sqlite3 connection may only be used by the thread that created it
+    (check_same_thread), so a threaded service either serializes on one
+    connection or crashes. The pool creates up to max_size connections on
+    demand, each configured by configure_connection(), and lends each one to a
+    single thread at a time:
+    
+        with pool.connection() as conn:
+            conn.execute(...)
+    
+    A checkout is per thread: nested connection() blocks in the same thread
+    reuse the connection it already holds instead of taking another one (and
+    deadlocking once the pool is exhausted). When every connection is in use,
+    connection() waits up to `timeout` seconds and then raises TimeoutError.
+    A connection returned with an open transaction is rolled back first.
+    
+    The default pragmas are the "balanced" profile, whose WAL mode keeps
+    readers on other connections from being blocked by a writer, plus a busy
+    timeout so writers wait for the write lock instead of failing with
+    "database is locked".
+    """
+    
+    DEFAULT_PRAGMAS = dict(PRAGMA_PROFILES["balanced"], busy_timeout=5000)
+    
+    def __init__(self, db_path, max_size=8, timeout=5.0, pragmas=None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = self.DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.size = 0
+        self.closed = False
+        # LIFO, so the most recently used connections (with warm page caches) go out first
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    def _create(self):
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        return configure_connection(connection, self.pragmas)
+    
+    def acquire(self, timeout=None):
+        """Check out a connection, creating one if the pool isn't full yet."""
+        if self.closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self.size < self.max_size
+            if create:
+                self.size += 1
+        if create:
+            try:
+                return self._create()
+            except sqlite3.Error:
+                with self._lock:
+                    self.size -= 1
+                raise
+        wait = self.timeout if timeout is None else timeout
+        try:
+            return self._idle.get(timeout=wait)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {wait}s "
+                               f"({self.max_size} in use)") from None
+    
+    def release(self, connection):
+        """Return a checked-out connection to the pool."""
+        if connection.in_transaction:
+            connection.rollback()
+        if self.closed:
+            connection.close()
+            with self._lock:
+                self.size -= 1
+        else:
+            self._idle.put(connection)
+    
+    def current(self):
+        """The connection checked out by the calling thread, if any."""
+        return getattr(self._local, "connection", None)
+    
+    @contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection for the calling thread for the duration of the block."""
+        held = self.current()
+        if held is not None:
+            yield held
+            return
+        connection = self.acquire(timeout)
+        self._local.connection = connection
+        try:
+            yield connection
+        finally:
+            self._local.connection = None
+            self.release(connection)
+    
+    def close(self):
+        """Close idle connections now and checked-out ones as they are returned."""
+        self.closed = True
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self._lock:
+                self.size -= 1
 
 
 class SQLiteExample:
     """A class to demonstrate SQLite database operations."""
     
-    def __init__(self, db_file="example.db"):
+    def __init__(self, db_file="example.db", profile="balanced"):
         """Initialize the database connection."""
         # Get the directory of this file
         base_dir = os.path.dirname(os.path.abspath(__file__))
         self.db_path = os.path.join(base_dir, db_file)
-        self.connection = None
+        self.profile = profile
+        self._connection = None
+        self.pool = None
+    
+    @property
+    def connection(self):
+        """
+        The connection the methods below use.
+        
+        Inside a `with db.pool.connection():` block this is the connection the
+        calling thread checked out, so the same SQLiteExample can be shared by
+        many threads; otherwise it's the one opened by connect().
+        """
+        if self.pool is not None:
+            held = self.pool.current()
+            if held is not None:
+                return held
+        return self._connection
+    
+    @connection.setter
+    def connection(self, connection):
+        self._connection = connection
     
     def connect(self):
         """Connect to the SQLite database."""
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            # Enable foreign keys
-            self.connection.execute("PRAGMA foreign_keys = ON")
-            # Set the row factory to return rows as dictionaries
-            self.connection.row_factory = sqlite3.Row
+            self.connection = configure_connection(sqlite3.connect(self.db_path),
+                                                   PRAGMA_PROFILES[self.profile])
             print(f"Connected to database: {self.db_path}")
             return True
         except sqlite3.Error as e:
             print(f"Error connecting to database: {e}")
             return False
     
+    def apply_profile(self, name):
+        """Switch the current connection to one of PRAGMA_PROFILES."""
+        try:
+            configure_connection(self.connection, PRAGMA_PROFILES[name])
+            self.profile = name
+            return True
+        except sqlite3.Error as e:
+            print(f"Error applying profile {name}: {e}")
+            return False
+    
+    @contextmanager
+    def use_profile(self, name):
+        """
+        Use a profile for the duration of a block, then switch back.
+        
+            with db.use_profile("bulk-load"):
+                db.insert_users_many(rows)
+        
+        Leaving a profile that disabled automatic checkpoints checkpoints the
+        WAL, so it doesn't stay as large as everything written in the block.
+        """
+        previous = self.profile
+        self.apply_profile(name)
+        try:
+            yield self
+        finally:
+            self.apply_profile(previous)
+            if PRAGMA_PROFILES[name]["wal_autocheckpoint"] == 0:
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    def create_pool(self, max_size=8, timeout=5.0, pragmas=None):
+        """Create a ConnectionPool for using this database from several threads."""
+        if pragmas is None:
+            pragmas = dict(PRAGMA_PROFILES[self.profile], busy_timeout=5000)
+        self.pool = ConnectionPool(self.db_path, max_size, timeout, pragmas)
+        print(f"Connection pool created with up to {max_size} connections")
+        return self.pool
+    
     def close(self):
         """Close the database connection."""
-        if self.connection:
-            self.connection.close()
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+        if self._connection:
+            self._connection.close()
             print("Database connection closed")
     
     def create_tables(self):
@@ -52,6 +300,7 @@ class SQLiteExample:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     username TEXT NOT NULL UNIQUE,
                     email TEXT NOT NULL UNIQUE,
+                    post_count INTEGER NOT NULL DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
@@ -63,6 +312,7 @@ class SQLiteExample:
                     title TEXT NOT NULL,
                     content TEXT NOT NULL,
                     user_id INTEGER NOT NULL,
+                    comment_count INTEGER NOT NULL DEFAULT 0,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
                 )
@@ -81,6 +331,20 @@ class SQLiteExample:
                 )
             ''')
             
+            # Indexes for the lookups and orderings used below. IF NOT EXISTS
+            # also adds them to databases created before they existed.
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_posts_user_id_created_at ON posts (user_id, created_at)"
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_comments_post_id_created_at ON comments (post_id, created_at)"
+            )
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_user_id ON comments (user_id)")
+            
+            self._create_counters(cursor)
+            self._create_search_index(cursor)
+            
             self.connection.commit()
             print("Tables created successfully")
             return True
@@ -88,6 +352,108 @@ class SQLiteExample:
             print(f"Error creating tables: {e}")
             return False
     
+    def _create_counters(self, cursor):
+        """
+        Set up the denormalized post_count/comment_count columns.
+        
+        Triggers keep the counters in step with every insert, delete and
+        re-parenting, inside the same transaction as the change itself.
+        Databases created before the counters existed get the columns added
+        and backfilled.
+        """
+        added = False
+        for table, column in (("users", "post_count"), ("posts", "comment_count")):
+            columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+                added = True
+            # Leaderboards read these in descending order straight from the index
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column} DESC)")
+        
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS posts_after_insert AFTER INSERT ON posts
+            BEGIN
+                UPDATE users SET post_count = post_count + 1 WHERE id = NEW.user_id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS posts_after_delete AFTER DELETE ON posts
+            BEGIN
+                UPDATE users SET post_count = post_count - 1 WHERE id = OLD.user_id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS posts_after_update_user AFTER UPDATE OF user_id ON posts
+            BEGIN
+                UPDATE users SET post_count = post_count - 1 WHERE id = OLD.user_id;
+                UPDATE users SET post_count = post_count + 1 WHERE id = NEW.user_id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS comments_after_insert AFTER INSERT ON comments
+            BEGIN
+                UPDATE posts SET comment_count = comment_count + 1 WHERE id = NEW.post_id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS comments_after_delete AFTER DELETE ON comments
+            BEGIN
+                UPDATE posts SET comment_count = comment_count - 1 WHERE id = OLD.post_id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS comments_after_update_post AFTER UPDATE OF post_id ON comments
+            BEGIN
+                UPDATE posts SET comment_count = comment_count - 1 WHERE id = OLD.post_id;
+                UPDATE posts SET comment_count = comment_count + 1 WHERE id = NEW.post_id;
+            END;
+        ''')
+        
+        if added:
+            self.reconcile_counts()
+    
+    def _create_search_index(self, cursor):
+        """
+        Set up the full-text index used by search_posts().
+        
+        posts_fts is an FTS5 external-content table: it stores only the index
+        and reads title and content back from posts, so the text isn't kept
+        twice. Triggers keep the index in step with every insert, delete and
+        edit of a post. The prefix option adds indexes for 2- and 3-character
+        prefixes so prefix queries don't scan the term list.
+        Results are ordered by bm25 with title matches weighted 5x.
+        An index created for a database that already has posts is filled
+        from them.
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+        ).fetchone()
+        if not exists:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE posts_fts USING fts5(
+                    title, content,
+                    content='posts', content_rowid='id',
+                    prefix='2 3'
+                )
+            ''')
+            cursor.execute("INSERT INTO posts_fts (posts_fts, rank) VALUES ('rank', 'bm25(5.0, 1.0)')")
+            cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+        
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS posts_fts_after_insert AFTER INSERT ON posts
+            BEGIN
+                INSERT INTO posts_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS posts_fts_after_delete AFTER DELETE ON posts
+            BEGIN
+                INSERT INTO posts_fts (posts_fts, rowid, title, content)
+                VALUES ('delete', OLD.id, OLD.title, OLD.content);
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS posts_fts_after_update AFTER UPDATE OF title, content ON posts
+            BEGIN
+                INSERT INTO posts_fts (posts_fts, rowid, title, content)
+                VALUES ('delete', OLD.id, OLD.title, OLD.content);
+                INSERT INTO posts_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+            END;
+        ''')
+    
     def insert_user(self, username, email):
         """Insert a new user into the users table."""
         try:
@@ -136,76 +502,204 @@ class SQLiteExample:
             print(f"Error inserting comment: {e}")
             return None
     
-    def get_users(self):
-        """Get all users from the users table."""
+    def insert_users_many(self, users, chunk_size=50000):
+        """
+        Insert (username, email) pairs in bulk.
+        
+        See _insert_many() for the batching. Returns the new user ids in
+        input order, or None on error.
+        """
+        return self._insert_many("users", ("username", "email"), users, chunk_size)
+    
+    def insert_posts_many(self, posts, chunk_size=50000):
+        """Insert (title, content, user_id) tuples in bulk. Returns the new post ids."""
+        return self._insert_many("posts", ("title", "content", "user_id"), posts, chunk_size)
+    
+    def insert_comments_many(self, comments, chunk_size=50000):
+        """Insert (content, user_id, post_id) tuples in bulk. Returns the new comment ids."""
+        return self._insert_many("comments", ("content", "user_id", "post_id"), comments, chunk_size)
+    
+    def _insert_many(self, table, columns, rows, chunk_size):
+        """
+        Insert rows from any iterable with executemany, one transaction per chunk.
+        
+        Committing once per chunk instead of once per row turns one fsync per
+        row into one per chunk, while keeping memory bounded for generators of
+        any length (chunk_size=None loads everything in one transaction).
+        
+        executemany() doesn't report the ids it created, but the ids are
+        contiguous: AUTOINCREMENT hands out increasing values and the
+        transaction holds the write lock, so a chunk of n rows ending at
+        last_insert_rowid() started n - 1 ids earlier.
+        
+        If a chunk fails it is rolled back; earlier chunks stay committed.
+        """
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = iter(rows)
+        ids = []
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM users")
-            users = [dict(row) for row in cursor.fetchall()]
-            return users
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                self.connection.executemany(sql, chunk)
+                last_id = self.connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self.connection.commit()
+                ids.extend(range(last_id - len(chunk) + 1, last_id + 1))
+            print(f"Inserted {len(ids)} rows into {table}")
+            return ids
         except sqlite3.Error as e:
-            print(f"Error retrieving users: {e}")
-            return []
+            self.connection.rollback()
+            print(f"Error inserting into {table} after {len(ids)} rows: {e}")
+            return None
+    
+    def get_users(self):
+        """Get all users from the users table."""
+        return list(self.iter_users())
     
     def get_posts(self, user_id=None):
         """
         Get posts from the posts table.
         If user_id is provided, only get posts from that user.
         """
+        return list(self.iter_posts(user_id))
+    
+    def iter_users(self, row_format="dict", batch_size=1000):
+        """Yield every user lazily; see _iter_rows() for the row formats."""
+        yield from self._iter_rows("SELECT * FROM users", (), row_format, batch_size, "users")
+    
+    def iter_posts(self, user_id=None, row_format="dict", batch_size=1000):
+        """Yield posts newest first, optionally only those of one user."""
+        if user_id:
+            sql, params = "SELECT * FROM posts WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+        else:
+            sql, params = "SELECT * FROM posts ORDER BY created_at DESC", ()
+        yield from self._iter_rows(sql, params, row_format, batch_size, "posts")
+    
+    def iter_search(self, search_term, limit=None, prefix=True, row_format="dict", batch_size=1000):
+        """
+        Yield posts matching every word of the search term, best match first.
+        
+        Matching uses the posts_fts index: whole words, case-insensitive, with
+        the last word also matching as a prefix unless prefix=False ("pyth"
+        finds "python"). Each row carries the post, the author's username, a
+        snippet of the best matching passage with matches in [brackets], and
+        its bm25 rank (lower is better). limit=None returns every match.
+        """
+        query = fts_query(search_term, prefix)
+        if query is None:
+            return
+        yield from self._iter_rows(
+            """
+            SELECT p.*, u.username,
+                   snippet(posts_fts, -1, '[', ']', '...', 12) AS snippet,
+                   posts_fts.rank AS rank
+            FROM posts_fts
+            JOIN posts p ON p.id = posts_fts.rowid
+            JOIN users u ON u.id = p.user_id
+            WHERE posts_fts MATCH ?
+            ORDER BY posts_fts.rank
+            LIMIT ?
+            """,
+            (query, -1 if limit is None else limit), row_format, batch_size, "posts"
+        )
+    
+    def _iter_rows(self, sql, params, row_format, batch_size, label):
+        """
+        Run a query and yield its rows in batches of fetchmany(batch_size).
+        
+        Only one batch is in memory at a time, instead of the whole result
+        from fetchall() plus a dict copy of every row. row_format picks the
+        row type:
+        - "dict": a plain dict per row (what the get_* methods return)
+        - "row": sqlite3.Row, indexable by name or position, and cheaper than a dict
+        - "tuple": plain tuples, the cheapest
+        
+        The query stays open until the generator is exhausted or closed, so
+        don't keep a half-read generator around.
+        """
+        if row_format not in ("dict", "row", "tuple"):
+            raise ValueError(f"Unknown row format: {row_format}")
+        cursor = self.connection.cursor()
         try:
-            cursor = self.connection.cursor()
-            if user_id:
-                cursor.execute(
-                    "SELECT * FROM posts WHERE user_id = ? ORDER BY created_at DESC",
-                    (user_id,)
-                )
-            else:
-                cursor.execute("SELECT * FROM posts ORDER BY created_at DESC")
-            
-            posts = [dict(row) for row in cursor.fetchall()]
-            return posts
+            cursor.execute(sql, params)
+            if row_format == "tuple":
+                cursor.row_factory = None
+            elif row_format == "dict":
+                columns = [column[0] for column in cursor.description]
+                cursor.row_factory = lambda _, row: dict(zip(columns, row))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
         except sqlite3.Error as e:
-            print(f"Error retrieving posts: {e}")
-            return []
+            print(f"Error retrieving {label}: {e}")
+        finally:
+            cursor.close()
     
-    def get_post_with_comments(self, post_id):
-        """Get a post and all its comments."""
+    def get_post_with_comments(self, post_id, limit=50, after=None):
+        """
+        Get a post and one page of its comments, oldest first, in one query.
+        
+        The post is LEFT JOINed to its comments, so a single statement returns
+        the post (on every row, or on one row with NULL comment columns if
+        there are none) and up to limit + 1 comments; the extra row only tells
+        whether another page exists. The rows are shaped into the result in
+        the same pass that reads them.
+        
+        Pages use keyset pagination: pass the returned 'next_cursor' as
+        `after` to get the following page. The cursor is the last comment's
+        (created_at, id), which the (post_id, created_at) index can seek to
+        directly, so page 1000 costs the same as page 1, unlike OFFSET.
+        'comment_count' is the total, read from the maintained counter.
+        """
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        keyset = "AND (c.created_at, c.id) > (?, ?)" if after else ""
+        params = (post_id, *after, post_id, limit + 1) if after else (post_id, post_id, limit + 1)
         try:
             cursor = self.connection.cursor()
-            # Get the post
+            cursor.row_factory = None
             cursor.execute(
-                """
-                SELECT p.*, u.username 
+                f"""
+                SELECT p.id, p.title, p.content, p.user_id, p.comment_count, p.created_at, pu.username,
+                       c.id, c.content, c.user_id, c.created_at, cu.username
                 FROM posts p
-                JOIN users u ON p.user_id = u.id
+                JOIN users pu ON pu.id = p.user_id
+                LEFT JOIN comments c ON c.post_id = ? {keyset}
+                LEFT JOIN users cu ON cu.id = c.user_id
                 WHERE p.id = ?
+                ORDER BY c.created_at, c.id
+                LIMIT ?
                 """,
-                (post_id,)
+                params
             )
-            post = cursor.fetchone()
             
-            if not post:
+            post = None
+            comments = []
+            for row in cursor:
+                if post is None:
+                    post = {
+                        'id': row[0], 'title': row[1], 'content': row[2], 'user_id': row[3],
+                        'comment_count': row[4], 'created_at': row[5], 'username': row[6],
+                        'comments': comments,
+                    }
+                if row[7] is not None:
+                    comments.append({
+                        'id': row[7], 'content': row[8], 'user_id': row[9], 'post_id': post_id,
+                        'created_at': row[10], 'username': row[11],
+                    })
+            
+            if post is None:
                 print(f"Post with ID {post_id} not found")
                 return None
             
-            post_dict = dict(post)
-            
-            # Get the comments for the post
-            cursor.execute(
-                """
-                SELECT c.*, u.username
-                FROM comments c
-                JOIN users u ON c.user_id = u.id
-                WHERE c.post_id = ?
-                ORDER BY c.created_at ASC
-                """,
-                (post_id,)
-            )
-            
-            comments = [dict(row) for row in cursor.fetchall()]
-            post_dict['comments'] = comments
-            
-            return post_dict
+            has_more = len(comments) > limit
+            del comments[limit:]
+            last = comments[-1] if comments else None
+            post['next_cursor'] = (last['created_at'], last['id']) if has_more else None
+            return post
         except sqlite3.Error as e:
             print(f"Error retrieving post: {e}")
             return None
@@ -265,29 +759,11 @@ class SQLiteExample:
             print(f"Error deleting post: {e}")
             return False
     
-    def search_posts(self, search_term):
-        """Search for posts containing the search term in title or content."""
-        try:
-            cursor = self.connection.cursor()
-            search_pattern = f"%{search_term}%"
-            
-            cursor.execute(
-                """
-                SELECT p.*, u.username 
-                FROM posts p
-                JOIN users u ON p.user_id = u.id
-                WHERE p.title LIKE ? OR p.content LIKE ?
-                ORDER BY p.created_at DESC
-                """,
-                (search_pattern, search_pattern)
-            )
-            
-            results = [dict(row) for row in cursor.fetchall()]
-            print(f"Found {len(results)} posts matching '{search_term}'")
-            return results
-        except sqlite3.Error as e:
-            print(f"Error searching posts: {e}")
-            return []
+    def search_posts(self, search_term, limit=20, prefix=True):
+        """Search posts by title and content; see iter_search() for the matching rules."""
+        results = list(self.iter_search(search_term, limit, prefix))
+        print(f"Found {len(results)} posts matching '{search_term}'")
+        return results
     
     def execute_transaction(self):
         """Demonstrate a transaction that ensures all operations complete or none do."""
@@ -326,6 +802,69 @@ class SQLiteExample:
             print(f"Transaction failed: {e}")
             return False
     
+    def reconcile_counts(self):
+        """
+        Recompute the denormalized counters from the source tables.
+        
+        Only rows whose stored count has drifted are rewritten.
+        Returns the number of rows that were repaired.
+        """
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                UPDATE users SET post_count = (
+                    SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id
+                )
+                WHERE post_count != (SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id)
+            """)
+            repaired = cursor.rowcount
+            cursor.execute("""
+                UPDATE posts SET comment_count = (
+                    SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id
+                )
+                WHERE comment_count != (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+            """)
+            repaired += cursor.rowcount
+            self.connection.commit()
+            print(f"Reconciled counters, {repaired} rows repaired")
+            return repaired
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            print(f"Error reconciling counters: {e}")
+            return None
+    
+    def get_top_users(self, limit=10):
+        """Get the users with the most posts using the post_count index."""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                "SELECT id, username, email, post_count FROM users ORDER BY post_count DESC LIMIT ?",
+                (limit,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error retrieving top users: {e}")
+            return []
+    
+    def get_top_posts(self, limit=10):
+        """Get the most commented posts using the comment_count index."""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                """
+                SELECT p.id, p.title, u.username AS author, p.comment_count, p.created_at
+                FROM posts p
+                JOIN users u ON p.user_id = u.id
+                ORDER BY p.comment_count DESC
+                LIMIT ?
+                """,
+                (limit,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Error retrieving top posts: {e}")
+            return []
+    
     def demonstrate_joins(self):
         """Demonstrate SQL joins to retrieve related data."""
         try:
@@ -370,8 +909,383 @@ class SQLiteExample:
             return {}
 
 
+# Methods that are expected to read whole tables: unbounded listings and
+# whole-table aggregation/maintenance.
+PLAN_CHECK_ALLOWED_SCANS = {'get_users', 'demonstrate_joins', 'reconcile_counts'}
+
+
+def check_query_plans(users=2000, posts=20000, comments=60000, allowed_scans=PLAN_CHECK_ALLOWED_SCANS):
+    """
+    Run EXPLAIN QUERY PLAN for every query SQLiteExample issues and fail on full scans.
+    
+    A throwaway database is seeded with a large dataset, each query method is
+    called while SQLite's trace callback records the SQL it sends, and each
+    captured statement is explained. A plan step that scans a table without an
+    index, or sorts with a temporary B-tree, raises AssertionError unless the
+    method is listed in allowed_scans.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = SQLiteExample(os.path.join(tmp_dir, "plan_check.db"))
+        db.connect()
+        db.create_tables()
+        
+        # Seed in one transaction; the triggers keep the counters right
+        synthetic_data.load(db.connection, synthetic_data.SyntheticDataset(users, posts, comments))
+        db.connection.execute("ANALYZE")
+        
+        captured = []
+        current = {"label": None}
+        
+        def trace(statement):
+            if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                captured.append((current["label"], statement))
+        
+        calls = [
+            ("get_users", lambda: db.get_users()),
+            ("get_posts", lambda: db.get_posts()),
+            ("get_posts(user_id)", lambda: db.get_posts(1)),
+            ("get_post_with_comments", lambda: db.get_post_with_comments(1)),
+            ("get_post_with_comments(after)",
+             lambda: db.get_post_with_comments(1, after=("2023-01-01 00:00:00", 0))),
+            ("search_posts", lambda: db.search_posts("python cache")),
+            ("get_top_users", lambda: db.get_top_users()),
+            ("get_top_posts", lambda: db.get_top_posts()),
+            ("update_user", lambda: db.update_user(1, email="renamed@example.com")),
+            ("delete_post", lambda: db.delete_post(2)),
+            ("demonstrate_joins", lambda: db.demonstrate_joins()),
+            ("reconcile_counts", lambda: db.reconcile_counts()),
+        ]
+        
+        # The query methods print their results; keep the report readable
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        db.connection.set_trace_callback(trace)
+        try:
+            for label, call in calls:
+                current["label"] = label
+                call()
+        finally:
+            db.connection.set_trace_callback(None)
+            sys.stdout.close()
+            sys.stdout = stdout
+        
+        failures = []
+        explained = set()
+        for label, statement in captured:
+            if label in allowed_scans or (label, statement) in explained:
+                continue
+            explained.add((label, statement))
+            for row in db.connection.execute(f"EXPLAIN QUERY PLAN {statement}"):
+                detail = row["detail"]
+                full_scan = detail.startswith("SCAN ") and "INDEX" not in detail
+                if full_scan or "USE TEMP B-TREE" in detail:
+                    failures.append(f"{label}: {detail}\n    {' '.join(statement.split())}")
+        db.close()
+    
+    if failures:
+        raise AssertionError("Queries without a usable index:\n" + "\n".join(failures))
+    print(f"Checked {len(explained)} distinct statements, no unexpected full scans.")
+    return True
+
+
+def benchmark_inserts(single_rows=200, bulk_rows=200000):
+    """
+    Compare rows per second of the single-row insert methods with the bulk ones.
+    
+    Each single-row call commits (and syncs) on its own, so it gets a smaller
+    sample. Both load users, then posts, then comments into a fresh database.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, rows in (("single-row", single_rows), ("bulk", bulk_rows)):
+            db = SQLiteExample(os.path.join(tmp_dir, f"{label}.db"))
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                db.connect()
+                db.create_tables()
+                users = [(f"user{i}", f"user{i}@example.com") for i in range(rows)]
+                start = time.perf_counter()
+                if label == "single-row":
+                    user_ids = [db.insert_user(*user) for user in users]
+                    post_ids = [db.insert_post(f"Post {i}", "Some content", user_id)
+                                for i, user_id in enumerate(user_ids)]
+                    for post_id, user_id in zip(post_ids, user_ids):
+                        db.insert_comment("A comment", user_id, post_id)
+                else:
+                    user_ids = db.insert_users_many(users)
+                    post_ids = db.insert_posts_many(
+                        (f"Post {i}", "Some content", user_id) for i, user_id in enumerate(user_ids)
+                    )
+                    db.insert_comments_many(
+                        ("A comment", user_id, post_id) for post_id, user_id in zip(post_ids, user_ids)
+                    )
+                elapsed = time.perf_counter() - start
+                db.close()
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            results[label] = 3 * rows / elapsed
+            print(f"{label:<12} {3 * rows:>8} rows in {elapsed:6.2f}s  {results[label]:>12,.0f} rows/s")
+    print(f"Speedup: {results['bulk'] / results['single-row']:.0f}x")
+    return results
+
+
+def benchmark_pool(threads=8, duration=3.0, pool_sizes=(1, 2, 4, 8), write_ratio=0.1):
+    """
+    Run a concurrent read/write workload through ConnectionPools of several sizes.
+    
+    `threads` workers share one SQLiteExample and, for `duration` seconds, each
+    either reads a post with its comments or (write_ratio of the time) adds a
+    comment. A pool of one connection is the "serialize everything" baseline.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = SQLiteExample(os.path.join(tmp_dir, "pool.db"))
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            db.connect()
+            db.create_tables()
+            dataset = synthetic_data.SyntheticDataset(users=2000, posts=20000, comments=100000)
+            synthetic_data.load(db.connection, dataset)
+            
+            for size in pool_sizes:
+                pool = db.create_pool(max_size=size, timeout=30)
+                counts = []
+                deadline = time.monotonic() + duration
+                
+                def worker(seed):
+                    rng = random.Random(seed)
+                    reads = writes = 0
+                    while time.monotonic() < deadline:
+                        with pool.connection():
+                            if rng.random() < write_ratio:
+                                db.insert_comment("Benchmark comment", rng.randint(1, 2000),
+                                                  rng.randint(1, 20000))
+                                writes += 1
+                            else:
+                                db.get_post_with_comments(rng.randint(1, 20000))
+                                reads += 1
+                    counts.append((reads, writes))
+                
+                workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+                for thread in workers:
+                    thread.start()
+                for thread in workers:
+                    thread.join()
+                pool.close()
+                reads = sum(r for r, _ in counts)
+                writes = sum(w for _, w in counts)
+                results[size] = (reads / duration, writes / duration)
+            db.close()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    
+    print(f"{threads} threads, {write_ratio:.0%} writes")
+    print(f"{'pool size':>9} {'reads/s':>10} {'writes/s':>10}")
+    for size, (reads, writes) in results.items():
+        print(f"{size:>9} {reads:>10,.0f} {writes:>10,.0f}")
+    return results
+
+
+def benchmark_profiles(rows=100000, chunk_size=2000, single_rows=100, read_seconds=2.0):
+    """
+    Print insert and read throughput for each pragma profile.
+    
+    For each profile a fresh database is seeded, then timed on:
+    - single-row inserts, each committed on its own (the fsync cost)
+    - bulk inserts of `rows` comments, committed every `chunk_size` rows
+    - random reads of a post with its comments for `read_seconds`
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in PRAGMA_PROFILES:
+            db = SQLiteExample(os.path.join(tmp_dir, f"{name}.db"), profile=name)
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                db.connect()
+                db.create_tables()
+                synthetic_data.load(db.connection, synthetic_data.SyntheticDataset(1000, 10000, 0))
+                
+                start = time.perf_counter()
+                for i in range(single_rows):
+                    db.insert_comment("Single comment", i % 1000 + 1, i % 10000 + 1)
+                single = single_rows / (time.perf_counter() - start)
+                
+                rng = random.Random(0)
+                comments = [("Bulk comment", rng.randint(1, 1000), rng.randint(1, 10000)) for _ in range(rows)]
+                start = time.perf_counter()
+                db.insert_comments_many(comments, chunk_size=chunk_size)
+                bulk = rows / (time.perf_counter() - start)
+                
+                reads = 0
+                deadline = time.perf_counter() + read_seconds
+                while time.perf_counter() < deadline:
+                    db.get_post_with_comments(rng.randint(1, 10000))
+                    reads += 1
+                db.close()
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            results[name] = (single, bulk, reads / read_seconds)
+    
+    print(f"{'profile':<10} {'single inserts/s':>17} {'bulk inserts/s':>15} {'reads/s':>9}")
+    for name, (single, bulk, reads) in results.items():
+        print(f"{name:<10} {single:>17,.0f} {bulk:>15,.0f} {reads:>9,.0f}")
+    return results
+
+
+def benchmark_streaming_memory(rows=1000000):
+    """
+    Compare peak Python memory of get_users() with iter_users() in each row format.
+    
+    The users table is filled with `rows` users, then every variant walks the
+    whole table while tracemalloc records the peak allocation.
+    """
+    import tracemalloc
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = SQLiteExample(os.path.join(tmp_dir, "stream.db"))
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            db.connect()
+            db.create_tables()
+            with db.use_profile("bulk-load"):
+                db.insert_users_many((f"user{i}", f"user{i}@example.com") for i in range(rows))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        
+        variants = [
+            ("get_users() list", lambda: db.get_users()),
+            ("iter_users dict", lambda: db.iter_users("dict")),
+            ("iter_users row", lambda: db.iter_users("row")),
+            ("iter_users tuple", lambda: db.iter_users("tuple")),
+        ]
+        print(f"{rows:,} users")
+        print(f"{'':<18} {'peak memory':>12} {'seconds':>8}")
+        for label, call in variants:
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = sum(1 for _ in call())
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert count == rows
+            results[label] = peak
+            print(f"{label:<18} {peak / 1024 / 1024:>9.1f} MB {elapsed:>8.2f}")
+        db.close()
+    return results
+
+
+def _search_corpus(posts, seed=0, vocabulary_size=20000):
+    """
+    Build (vocabulary, rows) for benchmark_search(): posts written with a
+    Zipf-distributed vocabulary, so words range from very common to rare
+    the way they do in real text. Post texts are drawn from pools of
+    pre-built sentences, as in synthetic_data, to keep generation fast.
+    """
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = list(dict.fromkeys(
+        "".join(rng.choices(letters, k=rng.randint(5, 9))) for _ in range(vocabulary_size * 2)
+    ))[:vocabulary_size]
+    weights = synthetic_data.zipf_cum_weights(vocabulary_size, 1.0)
+    titles = [" ".join(rng.choices(vocabulary, cum_weights=weights, k=6)) for _ in range(16384)]
+    bodies = [" ".join(rng.choices(vocabulary, cum_weights=weights, k=40)) for _ in range(16384)]
+    rows = ((titles[rng.getrandbits(14)], bodies[rng.getrandbits(14)], rng.randint(1, 1000))
+            for _ in range(posts))
+    return vocabulary, rows
+
+
+def benchmark_search(sizes=(100000, 1000000), limit=20, repeat=5):
+    """
+    Compare the old LIKE search with FTS5 search_posts() at each number of posts.
+    
+    Both return the first page of `limit` results: LIKE the newest matching
+    posts (walking the created_at index until it has a page), FTS the best
+    ranked ones. Prints the median milliseconds per query. LIKE is quick for
+    words that most posts contain, because the first page fills at once;
+    FTS ranks every match, so its cost follows the number of matches.
+    """
+    like_sql = """
+        SELECT p.*, u.username
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        WHERE p.title LIKE ? OR p.content LIKE ?
+        ORDER BY p.created_at DESC
+        LIMIT ?
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            db = SQLiteExample(os.path.join(tmp_dir, f"search_{size}.db"))
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                db.connect()
+                db.create_tables()
+                vocabulary, rows = _search_corpus(size)
+                with db.use_profile("bulk-load"):
+                    db.insert_users_many((f"user{i}", f"user{i}@example.com") for i in range(1000))
+                    db.insert_posts_many(rows)
+                db.connection.execute("ANALYZE")
+                
+                queries = [
+                    ("common word", vocabulary[0]),
+                    ("mid word", vocabulary[300]),
+                    ("rare word", vocabulary[10000]),
+                    ("two words", f"{vocabulary[0]} {vocabulary[300]}"),
+                    ("prefix", vocabulary[300][:4]),
+                    ("no match", "kubernetes"),
+                ]
+                for label, query in queries:
+                    # LIKE has no notion of words or prefixes; it gets the raw text
+                    pattern = f"%{query}%"
+                    timings = {}
+                    for method, run in (
+                        ("LIKE", lambda: db.connection.execute(like_sql, (pattern, pattern, limit)).fetchall()),
+                        ("FTS5", lambda: db.search_posts(query, limit)),
+                    ):
+                        samples = []
+                        for _ in range(repeat):
+                            start = time.perf_counter()
+                            run()
+                            samples.append((time.perf_counter() - start) * 1000)
+                        timings[method] = sorted(samples)[len(samples) // 2]
+                    timings["matches"] = sum(1 for _ in db.iter_search(query, row_format="tuple"))
+                    results[(size, label)] = timings
+                db.close()
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+    
+    print(f"{'posts':>9} {'query':<12} {'matches':>9} {'LIKE ms':>9} {'FTS5 ms':>9}")
+    for (size, label), timings in results.items():
+        print(f"{size:>9,} {label:<12} {timings['matches']:>9,} {timings['LIKE']:>9.2f} {timings['FTS5']:>9.2f}")
+    return results
+
+
 # Example usage
 if __name__ == "__main__":
+    if "--check-plans" in sys.argv:
+        check_query_plans()
+        sys.exit(0)
+    if "--benchmark-inserts" in sys.argv:
+        benchmark_inserts()
+        sys.exit(0)
+    if "--benchmark-pool" in sys.argv:
+        benchmark_pool()
+        sys.exit(0)
+    if "--benchmark-profiles" in sys.argv:
+        benchmark_profiles()
+        sys.exit(0)
+    if "--benchmark-streaming" in sys.argv:
+        benchmark_streaming_memory()
+        sys.exit(0)
+    if "--benchmark-search" in sys.argv:
+        benchmark_search()
+        sys.exit(0)
+    
     db = SQLiteExample()
     
     if db.connect():
@@ -466,5 +1380,12 @@ if __name__ == "__main__":
         print("\n=== Demonstrating Joins ===")
         db.demonstrate_joins()
         
+        # The same rankings from the maintained counters, without aggregation
+        print("\n=== Leaderboards from Counters ===")
+        for user in db.get_top_users(5):
+            print(f"User: {user['username']}, Posts: {user['post_count']}")
+        for post in db.get_top_posts(5):
+            print(f"Post: {post['title']}, Author: {post['author']}, Comments: {post['comment_count']}")
+        
         # Close the connection
         db.close()
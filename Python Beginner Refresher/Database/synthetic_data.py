@@ -0,0 +1,253 @@
+"""
+Synthetic Data Generator
+========================
+
+This module generates large, realistic datasets of users, posts and comments
+for benchmarking the database examples. It works with both schemas in this
+repository:
+
+- the raw sqlite3 schema created by SQLiteExample.create_tables()
+- the SQLAlchemy models in the Flask databases.py example
+
+Activity on real sites is heavily skewed: a few users write most of the posts
+and a few posts collect most of the comments. Authorship and comment targets
+are therefore drawn from Zipf distributions. The same seed always produces
+the same rows.
+
+Usage:
+    python synthetic_data.py example.db --users 10000 --posts 100000 --comments 500000
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+
+WORDS = (
+    "python flask sqlite database query index cache server client request "
+    "response template model view route session token api json schema "
+    "performance latency throughput worker thread process memory disk "
+    "network deploy test debug build release feature bug fix review"
+).split()
+
+BASE_TIME = datetime(2023, 1, 1)
+
+
+def zipf_cum_weights(n, exponent=1.1):
+    """Cumulative Zipf weights for ranks 1..n, ready for random.choices()."""
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, n + 1)))
+
+
+class SyntheticDataset:
+    """
+    A deterministic dataset of users, posts and comments.
+
+    Row values are produced lazily by the *_rows() generators, so datasets
+    much larger than memory can be streamed straight into executemany().
+    Only the per-row foreign keys and post timestamps are kept in memory.
+    """
+
+    def __init__(self, users, posts, comments, seed=0, exponent=1.1, time_span_days=365):
+        self.users = users
+        self.posts = posts
+        self.comments = comments
+        self.seed = seed
+        rng = random.Random(seed)
+
+        # Shuffle which ids are popular so activity isn't sorted by id
+        user_ranks = list(range(users))
+        rng.shuffle(user_ranks)
+        self.post_authors = rng.choices(user_ranks, cum_weights=zipf_cum_weights(users, exponent), k=posts)
+
+        post_ranks = list(range(posts))
+        rng.shuffle(post_ranks)
+        self.comment_posts = rng.choices(post_ranks, cum_weights=zipf_cum_weights(posts, exponent), k=comments)
+        self.comment_authors = rng.choices(user_ranks, cum_weights=zipf_cum_weights(users, exponent), k=comments)
+
+        span = time_span_days * 86400
+        self.post_offsets = [rng.randrange(span) for _ in range(posts)]
+
+        # Drawing words for every row dominates generation time, so rows pick
+        # from pools of pre-built sentences instead
+        self.titles = [self._text(rng, 5).capitalize() for _ in range(4096)]
+        self.bodies = [self._text(rng, 30) for _ in range(4096)]
+        self.remarks = [self._text(rng, 12) for _ in range(4096)]
+
+    def post_counts(self):
+        """Number of posts written by each user index."""
+        counts = [0] * self.users
+        for author in self.post_authors:
+            counts[author] += 1
+        return counts
+
+    def comment_counts(self):
+        """Number of comments on each post index (long-tailed)."""
+        counts = [0] * self.posts
+        for post in self.comment_posts:
+            counts[post] += 1
+        return counts
+
+    @staticmethod
+    def _text(rng, words):
+        return " ".join(rng.choices(WORDS, k=words))
+
+    def users_rows(self):
+        """Yield (index, username, email, created_at) for every user."""
+        for i in range(self.users):
+            created_at = BASE_TIME - timedelta(seconds=i)
+            yield i, f"user{self.seed}_{i}", f"user{self.seed}_{i}@example.com", created_at
+
+    def posts_rows(self):
+        """Yield (index, author index, title, content, created_at) for every post."""
+        rng = random.Random(self.seed + 1)
+        titles, bodies = self.titles, self.bodies
+        for i, (author, offset) in enumerate(zip(self.post_authors, self.post_offsets)):
+            yield (i, author, titles[rng.getrandbits(12)], bodies[rng.getrandbits(12)],
+                   BASE_TIME + timedelta(seconds=offset))
+
+    def comments_rows(self):
+        """Yield (index, author index, post index, content, created_at) for every comment."""
+        rng = random.Random(self.seed + 2)
+        remarks, post_offsets = self.remarks, self.post_offsets
+        for i, (post, author) in enumerate(zip(self.comment_posts, self.comment_authors)):
+            # Comments arrive after their post, mostly within the first hours
+            delay = int(rng.expovariate(1 / 7200))
+            yield (i, author, post, remarks[rng.getrandbits(12)],
+                   BASE_TIME + timedelta(seconds=post_offsets[post] + delay))
+
+
+def _table_columns(connection, table):
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+
+
+def _has_triggers(connection, table):
+    return connection.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?",
+        (table,)
+    ).fetchone()[0] > 0
+
+
+def _next_id(connection, table):
+    return connection.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+
+def load(connection, dataset, batch_size=50000):
+    """
+    Bulk insert a dataset through a sqlite3 connection.
+
+    The target schema is detected from the tables: optional columns such as
+    password_hash, updated_at, post_count and comment_count are filled in when
+    present. When the counters are kept by triggers (SQLiteExample) they are
+    left to the triggers; otherwise the precomputed counts are written. Ids
+    continue after the existing rows, so loading into a non-empty database works
+    as long as the dataset was made with a different seed: usernames and emails
+    are derived from it (user{seed}_{i}) and would collide with an earlier load.
+    If an insert fails, everything this call inserted is rolled back.
+
+    Returns a dict of rows inserted per table and the overall rows per second.
+    """
+    connection.commit()
+    user_columns = _table_columns(connection, "users")
+    post_columns = _table_columns(connection, "posts")
+    write_post_count = "post_count" in user_columns and not _has_triggers(connection, "posts")
+    write_comment_count = "comment_count" in post_columns and not _has_triggers(connection, "comments")
+
+    first_user = _next_id(connection, "users")
+    first_post = _next_id(connection, "posts")
+    first_comment = _next_id(connection, "comments")
+    post_counts = dataset.post_counts() if write_post_count else None
+    comment_counts = dataset.comment_counts() if write_comment_count else None
+
+    def user_values():
+        for i, username, email, created_at in dataset.users_rows():
+            row = [first_user + i, username, email, created_at.isoformat(" ")]
+            if "password_hash" in user_columns:
+                row.append(None)  # Synthetic users can't log in
+            if write_post_count:
+                row.append(post_counts[i])
+            yield row
+
+    def post_values():
+        for i, author, title, content, created_at in dataset.posts_rows():
+            timestamp = created_at.isoformat(" ")
+            row = [first_post + i, title, content, first_user + author, timestamp]
+            if "updated_at" in post_columns:
+                row.append(timestamp)
+            if write_comment_count:
+                row.append(comment_counts[i])
+            yield row
+
+    def comment_values():
+        for i, author, post, content, created_at in dataset.comments_rows():
+            yield (first_comment + i, content, first_user + author, first_post + post,
+                   created_at.isoformat(" "))
+
+    user_insert = ["id", "username", "email", "created_at"]
+    if "password_hash" in user_columns:
+        user_insert.append("password_hash")
+    if write_post_count:
+        user_insert.append("post_count")
+    post_insert = ["id", "title", "content", "user_id", "created_at"]
+    if "updated_at" in post_columns:
+        post_insert.append("updated_at")
+    if write_comment_count:
+        post_insert.append("comment_count")
+    comment_insert = ["id", "content", "user_id", "post_id", "created_at"]
+
+    start = time.perf_counter()
+    inserted = {}
+    try:
+        for table, columns, rows in (
+            ("users", user_insert, user_values()),
+            ("posts", post_insert, post_values()),
+            ("comments", comment_insert, comment_values()),
+        ):
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            count = 0
+            while True:
+                batch = [row for _, row in zip(range(batch_size), rows)]
+                if not batch:
+                    break
+                connection.executemany(sql, batch)
+                count += len(batch)
+            inserted[table] = count
+    except Exception:
+        # Leave the database as it was rather than holding a partial load open
+        connection.rollback()
+        raise
+    connection.commit()
+    elapsed = time.perf_counter() - start
+
+    total = sum(inserted.values())
+    inserted["seconds"] = elapsed
+    inserted["rows_per_second"] = total / elapsed if elapsed else 0.0
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load synthetic users, posts and comments.")
+    parser.add_argument("database", help="Path to an SQLite database with the tables already created")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--comments", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exponent", type=float, default=1.1, help="Zipf skew of activity")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    # Bulk-load settings: one big transaction and no fsync until it's done
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("PRAGMA foreign_keys = OFF")
+    dataset = SyntheticDataset(args.users, args.posts, args.comments, args.seed, args.exponent)
+    stats = load(connection, dataset)
+    connection.close()
+
+    print(f"Inserted {stats['users']} users, {stats['posts']} posts, {stats['comments']} comments "
+          f"in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()